@@ -1,4 +1,14 @@
+import atexit
+from collections import namedtuple
+from contextlib import contextmanager
+import os
+import random
+import re
 import sqlite3
+import threading
+import time
+
+from query_profiler import profiler
 
 # sample code how to use each function to manage the database
 #
@@ -67,94 +77,514 @@ import sqlite3
 #       columns = ["PRODUCT", "PROTEINS", "FATS", "CARBOHYDRATES", "KCAL"]
 #       values = ["'product'", -1, -1, -1, -1]
 #       db.update_data(db_name, table_name, columns, values, "PRODUCT = 'Lamborgini'")
+#
+# instead of formatting values into SQL text, use a query template with "?" placeholders and pass
+# the values separately, sqlite keeps the prepared statement of every template in its cache
+#       rows = db.query_data(db_name, "SELECT * FROM PRODUCTS WHERE KCAL > ? AND FATS < ?", (43, 9))
+#       db.execute_sql(db_name, "UPDATE PRODUCTS SET KCAL = ? WHERE PRODUCT = ?", (37, "Quince"))
+#
+# to go through a big table without loading it into memory use iter_data, it is a generator
+# that reads rows by batches of batch_size, named=True gives named tuples instead of plain tuples
+#       for record in db.iter_data(db_name, "NUTRITION", ["DATE", "CONSUMED_KCAL"], "USER = ?", ("TestUser",), named=True):
+#           print(record.DATE, record.CONSUMED_KCAL)
+#
+# the same for a whole query template with bind parameters
+#       for record in db.iter_query(db_name, "SELECT DATE, SUM(CONSUMED_KCAL) FROM NUTRITION WHERE USER = ? GROUP BY DATE", ("TestUser",)):
+#           print(record)
+#
+# the functions with a condition also accept bind parameters for it
+#       result = db.receive_data(db_name, table_name, "*", "PRODUCT = ?", ("O'Brien pie",))
+#       db.data_exists(db_name, table_name, "*", "PRODUCT = ?", ("Lamb",))
+#       db.delete_specific_data(db_name, table_name, "PRODUCT = ?", ("Apricot",))
+#
+# the size of the prepared statement cache (per connection) can be changed before the first query
+#       db.set_statement_cache_size(256)
+#
+# to load a lot of rows at once use insert_many, rows can be any iterable (also a generator),
+# they are passed to sqlite one by one and written with a single commit
+#       def read_products(path):
+#           with open(path, "r") as file:
+#               for line in file:
+#                   product, proteins, fats, carbohydrates, kcal = line.strip().split(";")
+#                   yield product, float(proteins), float(fats), float(carbohydrates), int(kcal)
+#
+#       db.insert_many(db_name, "PRODUCTS", ["PRODUCT", "PROTEINS", "FATS", "CARBOHYDRATES", "KCAL"], read_products("products.txt"))
+#
+# several writes can be grouped into one transaction (one commit at the end, rollback of everything
+# if an error happens inside the block), the seeding loop from above would look like this
+#       with db.transaction(db_name):
+#           with open("testfordb.txt", "r") as file:
+#               for line in file:
+#                   db.insert_data(db_name, line.strip())
+#
+# every executed statement is timed by the query profiler (see query_profiler.py), for example
+#       from query_profiler import profiler
+#       profiler.print_report(10)
+#
+# connections are not opened per call: every thread keeps one connection per database file,
+# it is opened on first use (WAL mode + pragmas below) and reused by all functions above,
+# if you need the raw connection for something special use
+#       conn = db.connect(db_name)
+#
+# and to close all opened connections (it is also done automatically at exit)
+#       db.close_all()
+#
+# when many clients write to one file, a writer waits for the lock up to busy_timeout seconds. If the database
+# is still locked, statements outside transaction() blocks, BEGIN IMMEDIATE of the blocks and commits are
+# retried up to retries times with exponential backoff (backoff, 2 * backoff, ... seconds, with jitter)
+#       db.set_lock_policy(busy_timeout=0.5, retries=5, backoff=0.02)
+#
+# number of retries and of statements that still failed after them
+#       db.lock_stats()                 # {"retries": 12, "failures": 0}
+#       db.reset_lock_stats()
+#
+# caches of table data can listen to changes, the listener is called after the commit with the absolute path
+# of the database file and the upper case name of every table changed by INSERT, UPDATE or DELETE of this
+# module (changes made by triggers or by other processes are not reported)
+#       def on_change(file_name, table_name):
+#           if table_name == "PRODUCTS":
+#               cache.clear()
+#
+#       db.add_change_listener(on_change)
+
+# table name of a changing statement
+_CHANGED_TABLE = re.compile(r"\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+[\"`\[]?(\w+)",
+                            re.IGNORECASE)
+
+
+class ConnectionManager:
+    # Keeps one long-lived connection per thread per database file
+    pragmas = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,       # negative value = size in KiB (~16 MB)
+        "mmap_size": 268435456,     # 256 MB
+        "temp_store": "MEMORY",
+    }
+    cached_statements = 128
+    busy_timeout = 5.0          # seconds sqlite waits for a lock before "database is locked"
+    lock_retries = 3            # retries after the busy timeout
+    retry_backoff = 0.05        # seconds before the first retry, doubled for every next one
+    max_backoff = 1.0
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._opened = []
+        self.retries = 0
+        self.failures = 0
+        self.listeners = []
+        # database file of every opened connection, for the change listeners
+        self.file_names = {}
+
+    def count_lock_error(self, retried):
+        with self._lock:
+            if retried:
+                self.retries += 1
+            else:
+                self.failures += 1
+
+    def _depths(self):
+        depths = getattr(self._local, "depths", None)
+        if depths is None:
+            depths = self._local.depths = {}
+        return depths
+
+    def enter_transaction(self, file_name):
+        # Mark that the current thread started transaction() block, returns nesting level
+        depths = self._depths()
+        key = os.path.abspath(file_name)
+        depths[key] = depths.get(key, 0) + 1
+        return depths[key]
+
+    def exit_transaction(self, file_name):
+        # Mark the end of transaction() block, returns nesting level that is left
+        depths = self._depths()
+        key = os.path.abspath(file_name)
+        depths[key] -= 1
+        return depths[key]
+
+    def in_transaction(self, file_name):
+        return self._depths().get(os.path.abspath(file_name), 0) > 0
+
+    def _changes(self):
+        changes = getattr(self._local, "changes", None)
+        if changes is None:
+            changes = self._local.changes = set()
+        return changes
+
+    def mark_changed(self, conn, sql=None, table_name=None):
+        # Remember the table changed by the statement of the current thread until the commit
+        if not self.listeners:
+            return
+        if table_name is None:
+            match = _CHANGED_TABLE.match(sql)
+            if match is None:
+                return
+            table_name = match.group(1)
+        self._changes().add((self.file_names.get(conn), table_name.upper()))
+
+    def notify_changes(self):
+        # Call the listeners for the committed changes of the current thread
+        changes = self._changes()
+        if not changes:
+            return
+        committed = list(changes)
+        changes.clear()
+        for file_name, table_name in committed:
+            for listener in self.listeners:
+                try:
+                    listener(file_name, table_name)
+                except Exception as e:
+                    print(f"Error in change listener: {e}")
+
+    def discard_changes(self):
+        self._changes().clear()
+
+    def get(self, file_name):
+        # Return connection of the current thread for the database file, open it if needed
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+            # busy timeout every connection was opened or last updated with
+            self._local.timeouts = {}
+
+        key = os.path.abspath(file_name)
+        conn = connections.get(key)
+        if conn is None:
+            conn = self._open(file_name)
+            connections[key] = conn
+            self._local.timeouts[key] = self.busy_timeout
+        elif self._local.timeouts.get(key) != self.busy_timeout:
+            # set_lock_policy changed the timeout, it is applied by the thread that owns the connection
+            conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)};")
+            self._local.timeouts[key] = self.busy_timeout
+        return conn
+
+    def _open(self, file_name):
+        # check_same_thread is off only to let close_all() close it at exit,
+        # the connection itself is used by the thread that opened it
+        conn = sqlite3.connect(file_name, timeout=self.busy_timeout, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value};")
+
+        with self._lock:
+            self._opened.append(conn)
+            self.file_names[conn] = os.path.abspath(file_name)
+        return conn
+
+    def close_all(self):
+        # Close every connection opened by any thread
+        with self._lock:
+            opened, self._opened = self._opened, []
+            self.file_names = {}
+
+        for conn in opened:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Error in close_all function: {e}")
+
+        self._local = threading.local()
+
+
+connections = ConnectionManager()
+atexit.register(connections.close_all)
+
+
+def _is_lock_error(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+def _with_lock_retry(conn, function, rollback=True):
+    # Call function(), retry it with backoff when the database is locked,
+    # rollback=True ends the implicit transaction that the failed statement has opened
+    attempt = 0
+    while True:
+        try:
+            return function()
+        except sqlite3.OperationalError as e:
+            if not _is_lock_error(e):
+                raise
+            if attempt >= connections.lock_retries:
+                connections.count_lock_error(retried=False)
+                raise
+
+            connections.count_lock_error(retried=True)
+            if rollback:
+                conn.rollback()
+            delay = min(connections.retry_backoff * 2 ** attempt, connections.max_backoff)
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            attempt += 1
+
 
 class DBControl:
+    @staticmethod
+    def connect(file_name):
+        # Get the shared connection of the current thread to the database file
+        return connections.get(file_name)
+
+    @staticmethod
+    def close_all():
+        # Close all shared connections
+        connections.close_all()
+
+    @staticmethod
+    def _execute(cursor, sql, params=(), fetch=None):
+        # Execute statement and record it in the query profiler,
+        # fetch="all" or "one" returns the fetched result, otherwise the cursor
+        start = time.perf_counter()
+        conn = cursor.connection
+        if conn.in_transaction:
+            # a statement inside a transaction can not be repeated alone, the caller handles the error
+            cursor.execute(sql, params)
+        else:
+            _with_lock_retry(conn, lambda: cursor.execute(sql, params))
+
+        if fetch == "all":
+            result = cursor.fetchall()
+            rows = len(result)
+        elif fetch == "one":
+            result = cursor.fetchone()
+            rows = 0 if result is None else 1
+        else:
+            result = cursor
+            rows = max(cursor.rowcount, 0)
+
+        connections.mark_changed(conn, sql)
+        profiler.record(cursor.connection, sql, params, time.perf_counter() - start, rows)
+        return result
+
+    @staticmethod
+    def _commit(file_name, conn):
+        # Commit changes, inside transaction() block the commit is done at its end
+        if not connections.in_transaction(file_name):
+            # a commit that failed because of the lock keeps the transaction, so it can be repeated
+            _with_lock_retry(conn, conn.commit, rollback=False)
+            connections.notify_changes()
+
+    @staticmethod
+    def _rollback(file_name, conn):
+        # Rollback failed changes, inside transaction() block returns False,
+        # so the error is raised further and the whole block is rolled back
+        if connections.in_transaction(file_name):
+            return False
+        conn.rollback()
+        connections.discard_changes()
+        return True
+
+    @staticmethod
+    @contextmanager
+    def transaction(file_name):
+        # Group many writes into one transaction with a single commit,
+        # nested blocks become part of the outer one
+        conn = DBControl.connect(file_name)
+        depth = connections.enter_transaction(file_name)
+        try:
+            # sqlite3 opens transaction only before INSERT/UPDATE/DELETE, so it is started
+            # explicitly to also cover reads and CREATE statements at the beginning of the block
+            if depth == 1 and not conn.in_transaction:
+                _with_lock_retry(conn, lambda: conn.execute("BEGIN IMMEDIATE;"), rollback=False)
+            yield conn
+        except BaseException:
+            connections.exit_transaction(file_name)
+            if depth == 1:
+                conn.rollback()
+                connections.discard_changes()
+            raise
+        if connections.exit_transaction(file_name) == 0:
+            try:
+                _with_lock_retry(conn, conn.commit, rollback=False)
+            except sqlite3.Error:
+                conn.rollback()
+                connections.discard_changes()
+                raise
+            connections.notify_changes()
+
+    @staticmethod
+    def insert_many(file_name, table_name, columns, rows):
+        # Insert many rows with one executemany, rows can be a generator (it is read lazily),
+        # returns number of inserted rows
+        sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))});"
+
+        conn = DBControl.connect(file_name)
+        try:
+            cursor = conn.cursor()
+            start = time.perf_counter()
+            if not conn.in_transaction:
+                # rows can be a generator that is read only once, so the write lock is taken
+                # (and retried) before executemany starts reading them
+                _with_lock_retry(conn, lambda: conn.execute("BEGIN IMMEDIATE;"), rollback=False)
+            cursor.executemany(sql, rows)
+            # the parameters of executemany are many rows, the statement is not explained
+            profiler.record(conn, sql, None, time.perf_counter() - start, cursor.rowcount)
+            connections.mark_changed(conn, table_name=table_name)
+            DBControl._commit(file_name, conn)
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            if not DBControl._rollback(file_name, conn):
+                raise
+            print(f"Error in insertMany function: {e}")
+            return 0
+        except BaseException:
+            # an error of the rows iterable (parser, file reader) must not leave the write lock and
+            # the inserted rows in an open transaction that the next statement of the thread would commit
+            DBControl._rollback(file_name, conn)
+            raise
+
+    @staticmethod
+    def set_lock_policy(busy_timeout=None, retries=None, backoff=None):
+        # Change waiting for locked database: busy timeout (seconds), number of retries and the first
+        # backoff (seconds). Retries and backoff are used by the next retry, the busy timeout of an open
+        # connection is updated when its thread uses it next time (connections of other threads are not touched)
+        if busy_timeout is not None:
+            connections.busy_timeout = busy_timeout
+        if retries is not None:
+            connections.lock_retries = retries
+        if backoff is not None:
+            connections.retry_backoff = backoff
+
+    @staticmethod
+    def lock_stats():
+        # Number of lock retries and of statements that failed after all retries
+        return {"retries": connections.retries, "failures": connections.failures}
+
+    @staticmethod
+    def reset_lock_stats():
+        connections.retries = 0
+        connections.failures = 0
+
+    @staticmethod
+    def add_change_listener(listener):
+        # listener(file_name, table_name) is called after every commit that changed the table
+        connections.listeners.append(listener)
+
+    @staticmethod
+    def remove_change_listener(listener):
+        if listener in connections.listeners:
+            connections.listeners.remove(listener)
+
+    @staticmethod
+    def set_statement_cache_size(size):
+        # Change the number of prepared statements kept per connection,
+        # connections are reopened so call it before the database is in use
+        connections.cached_statements = size
+        connections.close_all()
+
+    @staticmethod
+    def query_data(file_name, sql, params=()):
+        # Get all rows of the query template with bind parameters,
+        # it can also be a changing query with RETURNING (inside transaction() block)
+        try:
+            cursor = DBControl.connect(file_name).cursor()
+            return DBControl._execute(cursor, sql, params, fetch="all")
+        except sqlite3.Error as e:
+            if connections.in_transaction(file_name):
+                raise
+            print(f"Error in queryData function: {e}")
+            return []
+
+    @staticmethod
+    def execute_sql(file_name, sql, params=()):
+        # Execute changing query template (INSERT, UPDATE, DELETE) with bind parameters,
+        # returns number of changed rows
+        conn = DBControl.connect(file_name)
+        try:
+            cursor = conn.cursor()
+            DBControl._execute(cursor, sql, params)
+            DBControl._commit(file_name, conn)
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            if not DBControl._rollback(file_name, conn):
+                raise
+            print(f"Error in executeSql function: {e}")
+            return 0
+
     @staticmethod
     def create_db(file_name):
         # Create database
-        conn = sqlite3.connect(file_name)
-        conn.close()
+        DBControl.connect(file_name)
 
     @staticmethod
     def create_table(file_name, sql_columns):
         # Create table in the database
+        conn = DBControl.connect(file_name)
         try:
-            conn = sqlite3.connect(file_name)
             cursor = conn.cursor()
-            cursor.execute(sql_columns)
-            conn.commit()
+            DBControl._execute(cursor, sql_columns)
+            DBControl._commit(file_name, conn)
             print("Table created Successfully")
         except sqlite3.Error as e:
+            if not DBControl._rollback(file_name, conn):
+                raise
             print(f"Error in createTable function: {e}")
-        finally:
-            conn.close()
 
     @staticmethod
-    def delete_specific_data(file_name, table_name, condition):
+    def delete_specific_data(file_name, table_name, condition, params=()):
         # Delete specific data (row of data) from the table, according to condition
         sql = f"DELETE FROM {table_name} WHERE {condition};"
 
+        conn = DBControl.connect(file_name)
         try:
-            conn = sqlite3.connect(file_name)
             cursor = conn.cursor()
 
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sqlite_sequence';")
-            result = cursor.fetchone()
+            result = DBControl._execute(cursor, "SELECT name FROM sqlite_master WHERE type='table' AND name='sqlite_sequence';", fetch="one")
 
-            cursor.execute(sql)
+            DBControl._execute(cursor, sql, params)
             print("Records deleted Successfully!")
 
             if result:
                 sql_reset = f"DELETE FROM sqlite_sequence WHERE name = '{table_name}';"
-                cursor.execute(sql_reset)
+                DBControl._execute(cursor, sql_reset)
                 print("Auto-increment reset Successfully!")
             
-            conn.commit()
+            DBControl._commit(file_name, conn)
         except sqlite3.Error as e:
+            if not DBControl._rollback(file_name, conn):
+                raise
             print(f"Error in deleteData function: {e}")
-        finally:
-            conn.close()
             
     @staticmethod
     def delete_data(file_name, table_name):
         # Delete all data from the table
         sql = f"DELETE FROM {table_name};"
     
+        conn = DBControl.connect(file_name)
         try:
-            conn = sqlite3.connect(file_name)
             cursor = conn.cursor()
         
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sqlite_sequence';")
-            result = cursor.fetchone()
+            result = DBControl._execute(cursor, "SELECT name FROM sqlite_master WHERE type='table' AND name='sqlite_sequence';", fetch="one")
         
-            cursor.execute(sql)
+            DBControl._execute(cursor, sql)
             print("Records deleted Successfully!")
         
             if result:
                 sql_reset = f"DELETE FROM sqlite_sequence WHERE name = '{table_name}';"
-                cursor.execute(sql_reset)
+                DBControl._execute(cursor, sql_reset)
                 print("Auto-increment reset Successfully!")
         
-            conn.commit()
+            DBControl._commit(file_name, conn)
         except sqlite3.Error as e:
+            if not DBControl._rollback(file_name, conn):
+                raise
             print(f"Error in deleteData function: {e}")
-        finally:
-            conn.close()
 
 
     @staticmethod
     def insert_data(file_name, sql_value):
         # Insert data (one row of data) into table
+        conn = DBControl.connect(file_name)
         try:
-            conn = sqlite3.connect(file_name)
             cursor = conn.cursor()
-            cursor.execute(sql_value)
-            conn.commit()
+            DBControl._execute(cursor, sql_value)
+            DBControl._commit(file_name, conn)
             #print("Records inserted Successfully!")
         except sqlite3.Error as e:
+            if not DBControl._rollback(file_name, conn):
+                raise
             print(f"Error in insertData function: {e}")
-        finally:
-            conn.close()
 
     @staticmethod
     def print_data(file_name, table_name, columns_name, object_condition=""):
@@ -164,20 +594,16 @@ class DBControl:
             sql += f" WHERE {object_condition}"
 
         try:
-            conn = sqlite3.connect(file_name)
-            cursor = conn.cursor()
-            cursor.execute(sql)
-            rows = cursor.fetchall()
+            cursor = DBControl.connect(file_name).cursor()
+            rows = DBControl._execute(cursor, sql, fetch="all")
             for row in rows:
                 print(row)
             #print("Records printed Successfully!")
         except sqlite3.Error as e:
             print(f"Error in printData function: {e}")
-        finally:
-            conn.close()
 
     @staticmethod
-    def data_exists(file_name, table_name, columns_name, object_condition=""):
+    def data_exists(file_name, table_name, columns_name, object_condition="", params=()):
         # Check if the data exists in the table
         sql = f"SELECT {columns_name} FROM {table_name}"
         if object_condition:
@@ -187,19 +613,15 @@ class DBControl:
         exists = False
 
         try:
-            conn = sqlite3.connect(file_name)
-            cursor = conn.cursor()
-            cursor.execute(sql)
-            exists = cursor.fetchone() is not None
+            cursor = DBControl.connect(file_name).cursor()
+            exists = DBControl._execute(cursor, sql, params, fetch="one") is not None
         except sqlite3.Error as e:
             print(f"Failed to prepare statement: {e}")
-        finally:
-            conn.close()
 
         return exists
 
     @staticmethod
-    def receive_data(file_name, table_name, columns_name, object_condition=""):
+    def receive_data(file_name, table_name, columns_name, object_condition="", params=()):
         # Get all data from the table, according to condition
         sql = f"SELECT {columns_name} FROM {table_name}"
         if object_condition:
@@ -208,20 +630,57 @@ class DBControl:
         received_tuple = []
             
         try:
-            conn = sqlite3.connect(file_name)
-            cursor = conn.cursor()
-            cursor.execute(sql)
-            rows = cursor.fetchall()
-            for row in rows:
-                received_tuple.append(row)
+            cursor = DBControl.connect(file_name).cursor()
+            received_tuple = DBControl._execute(cursor, sql, params, fetch="all")
             #print("Records printed Successfully!")
         except sqlite3.Error as e:
             print(f"Error in printData function: {e}")
-        finally:
-            conn.close()
 
         return received_tuple
 
+    @staticmethod
+    def iter_data(file_name, table_name, columns_name, object_condition="", params=(), batch_size=500, named=False):
+        # Generator of the table rows (according to condition) that reads them by batches,
+        # columns_name can be a string or a list of columns, named=True yields named tuples
+        if not isinstance(columns_name, str):
+            columns_name = ", ".join(columns_name)
+
+        sql = f"SELECT {columns_name} FROM {table_name}"
+        if object_condition:
+            sql += f" WHERE {object_condition}"
+
+        return DBControl.iter_query(file_name, sql, params, batch_size, named)
+
+    @staticmethod
+    def iter_query(file_name, sql, params=(), batch_size=500, named=False):
+        # Generator of the rows of the query template with bind parameters, read by batches
+        try:
+            cursor = DBControl.connect(file_name).cursor()
+            start = time.perf_counter()
+            cursor.execute(sql, params)
+            # time of the caller between batches is not counted
+            elapsed = time.perf_counter() - start
+            count = 0
+
+            row_type = None
+            if named:
+                row_type = namedtuple("Row", [column[0] for column in cursor.description], rename=True)
+
+            while True:
+                start = time.perf_counter()
+                rows = cursor.fetchmany(batch_size)
+                elapsed += time.perf_counter() - start
+                if not rows:
+                    break
+
+                count += len(rows)
+                for row in rows:
+                    yield row_type._make(row) if row_type else row
+
+            profiler.record(cursor.connection, sql, params, elapsed, count)
+        except sqlite3.Error as e:
+            print(f"Error in iterQuery function: {e}")
+
     @staticmethod
     def update_data(file_name, table_name, columns_array, values_array, object_condition=""):
         # Update specific data in the table by setting names of columns and their values, according to condition
@@ -236,13 +695,13 @@ class DBControl:
         if object_condition:
             sql += f" WHERE {object_condition}"
 
+        conn = DBControl.connect(file_name)
         try:
-            conn = sqlite3.connect(file_name)
             cursor = conn.cursor()
-            cursor.execute(sql)
-            conn.commit()
+            DBControl._execute(cursor, sql)
+            DBControl._commit(file_name, conn)
             #print("Email updated successfully.")
         except sqlite3.Error as e:
+            if not DBControl._rollback(file_name, conn):
+                raise
             print(f"Error updating email: {e}")
-        finally:
-            conn.close()
\ No newline at end of file
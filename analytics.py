@@ -0,0 +1,273 @@
+import json
+import os
+import threading
+from collections import deque
+from datetime import date, timedelta
+
+from DB_control import DBControl
+from db_worker import get_worker
+
+# Rolling analytics of a user next to the statistics table: 7 and 30 day moving averages of kcal and
+# macros, on-target streaks and week-over-week deltas. The last 30 days are kept in a ring buffer with
+# running sums of every window, so a new day or a changed day costs O(1) instead of a scan of the history.
+# The state is saved to ANALYTICS_STATE and continues after a restart from the last saved day.
+#
+#       analytics = get_analytics(calorie_counter)
+#       summary = analytics.refresh()                   # add missing days and today's totals, returns summary
+#       summary["average"][7]["kcal"], summary["streak"], summary["best_streak"], summary["week_over_week"]["kcal"]
+#
+#       analytics.update_day(day, (proteins, fats, carbs, kcal))    # totals of a day of the window were changed
+#       analytics.rebuild()                                         # state from the whole history
+#
+# days before the last saved one that were changed outside the app (imports, repairs) need rebuild()
+#
+# averages are per day with consumed calories, a day is on target when its kcal are within
+# ON_TARGET_TOLERANCE of the norm in effect on that day
+
+WINDOWS = (7, 14, 30)
+RING_SIZE = max(WINDOWS)
+ON_TARGET_TOLERANCE = 0.10
+VALUE_NAMES = ("proteins", "fats", "carbs", "kcal")
+STATE_VERSION = 1
+
+
+class RollingAnalytics:
+    def __init__(self, calorie_counter):
+        self.calorie_counter = calorie_counter
+        self.db_name = calorie_counter.db_name
+        self.user = calorie_counter.user.email
+        self._lock = threading.Lock()
+        self._reset()
+        # the saved state is read by the first call (in the worker for refresh_async), not by the constructor
+        self._loaded = False
+
+    def _reset(self):
+        self.last_date = None
+        # (totals, on target) of the days up to last_date, the newest is the last one
+        self.ring = deque(maxlen=RING_SIZE)
+        self.sums = {window: [0.0] * len(VALUE_NAMES) for window in WINDOWS}
+        self.days = {window: 0 for window in WINDOWS}
+        # streaks up to the day before last_date, so changes of the last day are O(1)
+        self.streak_before = 0
+        self.best_before = 0
+        self.streak = 0
+        self.best_streak = 0
+
+    # ------------------   Ring buffer   ------------------
+    def _is_on_target(self, day, totals):
+        _, _, _, norm_kcal = self.calorie_counter.get_norm_on(day)
+        kcal = totals[3]
+        return kcal > 0 and norm_kcal > 0 and abs(kcal - norm_kcal) <= norm_kcal * ON_TARGET_TOLERANCE
+
+    def _push_day(self, day, totals):
+        # Add the day after last_date, the days that leave the windows are subtracted
+        totals = tuple(totals)
+        for window in WINDOWS:
+            if len(self.ring) >= window:
+                old_totals, _ = self.ring[-window]
+                self._add_to_window(window, old_totals, -1)
+            self._add_to_window(window, totals, 1)
+
+        on_target = self._is_on_target(day, totals)
+        self.ring.append((totals, on_target))
+        self.streak_before = self.streak
+        self.best_before = self.best_streak
+        self.streak = self.streak_before + 1 if on_target else 0
+        self.best_streak = max(self.best_before, self.streak)
+        self.last_date = day
+
+    def _add_to_window(self, window, totals, sign):
+        sums = self.sums[window]
+        for i, value in enumerate(totals):
+            sums[i] += sign * value
+        if totals[3]:
+            self.days[window] += sign
+
+    def _advance_to(self, day):
+        # Add the days after last_date up to the day, read with one range query
+        if self.last_date is None:
+            first_date = self.calorie_counter.get_first_record_date() or day
+        else:
+            first_date = self.last_date + timedelta(days=1)
+        if first_date > day:
+            return False
+
+        # iter_daily_totals goes from the newest day, the days are pushed from the oldest one
+        days = list(self.calorie_counter.iter_daily_totals(first_date, day))
+        for current_date, totals in reversed(days):
+            self._push_day(current_date, totals)
+        return True
+
+    def update_day(self, day, totals):
+        # New totals of a day that is already in the state, returns True if something was changed
+        with self._lock:
+            self._ensure_loaded()
+            changed = self._update_day(day, tuple(totals))
+            if changed:
+                self._save()
+            return changed
+
+    def _update_day(self, day, totals):
+        if self.last_date is None or day > self.last_date:
+            return False
+        offset = (self.last_date - day).days
+        if offset >= len(self.ring):
+            # the day is older than the ring, only the streaks could change
+            self._rebuild()
+            return True
+
+        old_totals, old_on_target = self.ring[-1 - offset]
+        if old_totals == totals:
+            return False
+
+        for window in WINDOWS:
+            if offset < window:
+                self._add_to_window(window, old_totals, -1)
+                self._add_to_window(window, totals, 1)
+
+        on_target = self._is_on_target(day, totals)
+        self.ring[-1 - offset] = (totals, on_target)
+
+        if offset == 0:
+            self.streak = self.streak_before + 1 if on_target else 0
+            self.best_streak = max(self.best_before, self.streak)
+        elif on_target != old_on_target:
+            # a streak through an older day was broken or joined, it is counted again from the history
+            self._rebuild()
+        return True
+
+    # ------------------   Public API   ------------------
+    def refresh(self, today=None):
+        # Bring the state to today (missing days from the database, today's totals from the totals cache)
+        # and return the summary
+        today = today or date.today()
+        with self._lock:
+            self._ensure_loaded()
+            changed = False
+            if self.last_date is not None and self.last_date < today:
+                # products could be added to the last saved day after it was saved
+                last_totals = self.calorie_counter.get_daily_totals(self.db_name, self.last_date)
+                changed = self._update_day(self.last_date, last_totals)
+            changed = self._advance_to(today) or changed
+            changed = self._update_day(today, self.calorie_counter.get_daily_totals(self.db_name, today)) or changed
+            if changed:
+                self._save()
+            return self._summary()
+
+    def refresh_async(self, today=None):
+        # Run refresh in the background DB worker, returns Future
+        return get_worker().submit(self.refresh, today)
+
+    def rebuild(self):
+        with self._lock:
+            self._ensure_loaded()
+            self._rebuild()
+            self._save()
+
+    def _rebuild(self):
+        last_date = self.last_date or date.today()
+        self._reset()
+        self._advance_to(last_date)
+
+    def _summary(self):
+        average = {}
+        for window in WINDOWS:
+            days = self.days[window]
+            average[window] = {
+                name: round(value / days, 1) if days else 0
+                for name, value in zip(VALUE_NAMES, self.sums[window])
+            }
+
+        # this week against the week before it, by average of the days with data
+        previous_days = self.days[14] - self.days[7]
+        previous = [
+            (value_14 - value_7) / previous_days if previous_days else 0
+            for value_14, value_7 in zip(self.sums[14], self.sums[7])
+        ]
+        week_over_week = {
+            name: round(average[7][name] - previous_value, 1) if self.days[7] and previous_days else None
+            for name, previous_value in zip(VALUE_NAMES, previous)
+        }
+
+        return {
+            "last_date": self.last_date,
+            "average": {7: average[7], 30: average[30]},
+            "streak": self.streak,
+            "best_streak": self.best_streak,
+            "week_over_week": week_over_week
+        }
+
+    # ------------------   Persistence   ------------------
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._loaded = True
+            self._load()
+
+    def _load(self):
+        result = DBControl.receive_data(self.db_name, "ANALYTICS_STATE", "STATE", "USER = ?", (self.user,))
+        if not result:
+            return
+
+        try:
+            state = json.loads(result[0][0])
+            if state["version"] != STATE_VERSION:
+                return
+            self.last_date = date.fromisoformat(state["last_date"]) if state["last_date"] else None
+            self.ring = deque(((tuple(totals), on_target) for totals, on_target in state["ring"]), maxlen=RING_SIZE)
+            self.sums = {int(window): sums for window, sums in state["sums"].items()}
+            self.days = {int(window): days for window, days in state["days"].items()}
+            self.streak_before, self.best_before = state["streak_before"], state["best_before"]
+            self.streak, self.best_streak = state["streak"], state["best_streak"]
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"[ERROR] Analytics state of {self.user} is damaged, it will be rebuilt: {e}")
+            self._reset()
+
+    def _save(self):
+        state = {
+            "version": STATE_VERSION,
+            "last_date": self.last_date.isoformat() if self.last_date else None,
+            "ring": [[list(totals), on_target] for totals, on_target in self.ring],
+            "sums": self.sums,
+            "days": self.days,
+            "streak_before": self.streak_before,
+            "best_before": self.best_before,
+            "streak": self.streak,
+            "best_streak": self.best_streak
+        }
+        DBControl.execute_sql(
+            self.db_name,
+            """INSERT INTO ANALYTICS_STATE (USER, LAST_DATE, STATE) VALUES (?, ?, ?)
+               ON CONFLICT(USER) DO UPDATE SET LAST_DATE = excluded.LAST_DATE, STATE = excluded.STATE;""",
+            (self.user, state["last_date"], json.dumps(state))
+        )
+
+
+_analytics = {}
+_analytics_lock = threading.Lock()
+
+
+def get_analytics(calorie_counter):
+    # Shared RollingAnalytics of the user of the calorie counter
+    key = (os.path.abspath(calorie_counter.db_name), calorie_counter.user.email)
+    with _analytics_lock:
+        analytics = _analytics.get(key)
+        if analytics is None:
+            analytics = _analytics[key] = RollingAnalytics(calorie_counter)
+        return analytics
+
+
+def format_summary(summary):
+    # Text lines of the summary for the statistics window
+    average_7, average_30 = summary["average"][7], summary["average"][30]
+    lines = [
+        f"7-day average: {average_7['kcal']} kcal, P {average_7['proteins']} / F {average_7['fats']} / C {average_7['carbs']}",
+        f"30-day average: {average_30['kcal']} kcal, P {average_30['proteins']} / F {average_30['fats']} / C {average_30['carbs']}",
+        f"On-target streak: {summary['streak']} days (best {summary['best_streak']})",
+    ]
+
+    delta = summary["week_over_week"]
+    if delta["kcal"] is None:
+        lines.append("Week over week: not enough data")
+    else:
+        lines.append(f"Week over week: {delta['kcal']:+} kcal, P {delta['proteins']:+} / F {delta['fats']:+} / C {delta['carbs']:+}")
+    return lines
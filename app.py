@@ -4,10 +4,13 @@ from bmi_calculator import BMICalculator
 from nutrition_window import NutritionWindow
 from user import User
 from calorie_counting import CalorieCounting
+from migrations import apply_migrations
 
 class CalorieApp(ctk.CTk):
     def __init__(self):
         super().__init__()
+        apply_migrations("Health_database.db")
+
         self.title("Calorie Tracker")
         self.geometry("1000x600")
         self.resizable(True, True)
@@ -46,7 +49,7 @@ class CalorieApp(ctk.CTk):
 
         # Updating norm in db
         if name == "BMI":
-            self.calorie_counter.update_norm_if_needed("Health_database.db")
+            self.calorie_counter.update_norm_if_needed_async("Health_database.db")
 
         self.current_window = name
         self.windows[name].show()
\ No newline at end of file
@@ -0,0 +1,161 @@
+import argparse
+import hashlib
+import multiprocessing
+import os
+import time
+from datetime import date
+
+from DB_control import DBControl
+from calorie_counting import CalorieCounting
+from export import FORMATS, SUMMARY_COLUMNS, export_rows, open_writer
+from migrations import apply_migrations
+from user import User
+
+# Summary reports (rows of the statistics window plus macro totals) of every user of USERS table,
+# without Tk. Users are split into chunks that are processed by a pool of processes, each process
+# has its own database connection and streams the rows from SQLite.
+#
+# one combined file
+#       python batch_report.py Health_database.db --period month --output report.csv
+#       python batch_report.py Health_database.db --period week --format jsonl.gz --output report.jsonl.gz
+#
+# one file per user in a directory, files are named by the email of the user (names are not unique)
+#       python batch_report.py Health_database.db --period year --per-user reports/
+#
+# custom period, number of processes and users per task
+#       python batch_report.py Health_database.db --period custom --start 2025-01-01 --end 2025-03-31 \
+#           --workers 8 --chunk-size 50 --output q1.csv
+
+USER_COLUMNS = ["NAME", "EMAIL", "BIRTH_DATE", "WEIGHT", "HEIGHT", "SEX", "GOAL", "ACTIVITY_FACTOR"]
+REPORT_COLUMNS = [("USER", "text"), ("EMAIL", "text"), *SUMMARY_COLUMNS]
+
+
+def iter_users(db_name, batch_size=1000):
+    # Rows of USER_COLUMNS of all users, streamed from the database
+    yield from DBControl.iter_data(db_name, "USERS", USER_COLUMNS, batch_size=batch_size)
+
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_user_report(db_name, user_row, period, start_date=None, end_date=None):
+    # Report rows of one user as tuples in the order of REPORT_COLUMNS
+    user = User(*user_row)
+    calorie_counter = CalorieCounting(user, db_name)
+    for row in calorie_counter.iter_summary_rows(period, start_date, end_date):
+        yield (user.name, user.email, *row)
+
+
+def _user_file_name(user_row, output_format):
+    # File name from the email (primary key of USERS), a hash is added when characters were replaced,
+    # so two emails never get one file
+    email = user_row[1]
+    safe_name = "".join(char if char.isalnum() or char in "-_.@" else "_" for char in email)
+    if safe_name != email:
+        safe_name += "_" + hashlib.sha1(email.encode("utf-8")).hexdigest()[:8]
+    return f"{safe_name}.{output_format}"
+
+
+def report_chunk(task):
+    # Process a chunk of users in a pool process, returns (users, rows, rows of the combined report or None)
+    db_name, users, period, start_date, end_date, output_format, per_user_dir = task
+    combined_rows = None if per_user_dir else []
+    row_count = 0
+
+    for user_row in users:
+        try:
+            rows = iter_user_report(db_name, user_row, period, start_date, end_date)
+            if per_user_dir:
+                path = os.path.join(per_user_dir, _user_file_name(user_row, output_format))
+                row_count += export_rows(path, REPORT_COLUMNS, rows, output_format)
+            else:
+                before = len(combined_rows)
+                combined_rows.extend(rows)
+                row_count += len(combined_rows) - before
+        except Exception as e:
+            print(f"Error in report_chunk function, user {user_row[0]} <{user_row[1]}>: {e}")
+
+    DBControl.close_all()
+    return len(users), row_count, combined_rows
+
+
+def generate_reports(db_name, period="week", start_date=None, end_date=None, output_format="csv",
+                     output=None, per_user_dir=None, workers=None, chunk_size=20):
+    # Create reports of all users, returns statistics dictionary
+    if (output is None) == (per_user_dir is None):
+        raise ValueError("Either output or per_user_dir must be given")
+
+    apply_migrations(db_name)
+    if per_user_dir:
+        os.makedirs(per_user_dir, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    tasks = (
+        (db_name, chunk, period, start_date, end_date, output_format, per_user_dir)
+        for chunk in iter_chunks(iter_users(db_name), chunk_size)
+    )
+
+    writer = open_writer(output, REPORT_COLUMNS, output_format) if output else None
+    users = rows = 0
+    start = time.perf_counter()
+    try:
+        # "spawn" so that pool processes never inherit sqlite connections of this process
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            for chunk_users, chunk_rows, combined_rows in pool.imap(report_chunk, tasks):
+                users += chunk_users
+                rows += chunk_rows
+                if writer:
+                    for row in combined_rows:
+                        writer.write_row(row)
+    finally:
+        if writer:
+            writer.close()
+        DBControl.close_all()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "users": users,
+        "rows": rows,
+        "workers": workers,
+        "seconds": elapsed,
+        "users_per_second": users / elapsed if elapsed else 0,
+        "rows_per_second": rows / elapsed if elapsed else 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summary reports of all users")
+    parser.add_argument("db_name", nargs="?", default="Health_database.db")
+    parser.add_argument("--period", default="week", choices=["week", "month", "halfyear", "year", "alltime", "custom"])
+    parser.add_argument("--start", type=date.fromisoformat, help="first day of custom period (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="last day of custom period (YYYY-MM-DD)")
+    parser.add_argument("--format", default="csv", choices=FORMATS)
+    destination = parser.add_mutually_exclusive_group(required=True)
+    destination.add_argument("--output", help="combined report file")
+    destination.add_argument("--per-user", help="directory for one report file per user")
+    parser.add_argument("--workers", type=int, help="number of processes (default: number of CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=20, help="users per task")
+    args = parser.parse_args()
+    if args.period == "custom" and (args.start is None or args.end is None):
+        parser.error("--period custom needs --start and --end")
+
+    stats = generate_reports(args.db_name, args.period, args.start, args.end, args.format,
+                             args.output, args.per_user, args.workers, args.chunk_size)
+
+    print(f"Users:      {stats['users']}")
+    print(f"Rows:       {stats['rows']}")
+    print(f"Workers:    {stats['workers']}")
+    print(f"Time:       {stats['seconds']:.2f} s")
+    print(f"Throughput: {stats['users_per_second']:.1f} users/s, {stats['rows_per_second']:.1f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
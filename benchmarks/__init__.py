@@ -0,0 +1,8 @@
+# Micro-benchmarks for the database layer, run them from the project root, for example:
+#       python -m benchmarks.bench_connections
+#
+# the suite of the core paths on a synthetic database (benchmarks.synthetic), results are saved as JSON
+# and two runs are compared by benchmarks.compare
+#       python -m benchmarks.run --output base.json
+#       python -m benchmarks.run --output new.json
+#       python -m benchmarks.compare base.json new.json --threshold 10
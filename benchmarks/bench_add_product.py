@@ -0,0 +1,77 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from DB_control import DBControl
+from migrations import apply_migrations
+from nutrition import Nutrition
+from user import User
+
+# Measures the cost of Nutrition.add_consumed_product + remove_consumed_product while NUTRITION grows,
+# the time per call should stay the same because both paths only touch indexed USER/DATE rows.
+# Other users' history is bulk loaded between the steps.
+#
+#       python -m benchmarks.bench_add_product             (up to 1M rows)
+#       python -m benchmarks.bench_add_product 100000      (smaller maximum)
+
+DB_SOURCE = "Health_database.db"
+SIZES = [1000, 10000, 100000, 1000000]
+OPERATIONS = 1000
+
+
+def history_rows(start, count):
+    # Rows of other users, 50 products per user and day
+    first_day = date.today() - timedelta(days=365)
+    for i in range(start, start + count):
+        yield (f"user{i // 5000}@example.com", (first_day + timedelta(days=(i // 50) % 365)).isoformat(),
+               "Carrot", 100.0, 1.3, 0.1, 6.3, 29)
+
+
+def time_operations(nutrition):
+    start = time.perf_counter()
+    for i in range(OPERATIONS):
+        nutrition.add_consumed_product("Carrot", 100 + i)
+    added = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(OPERATIONS):
+        nutrition.remove_consumed_product("Carrot", float(100 + i))
+    removed = time.perf_counter() - start
+
+    return added / OPERATIONS, removed / OPERATIONS
+
+
+def main():
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1]
+    temp_dir = tempfile.mkdtemp()
+    db_name = os.path.join(temp_dir, "bench.db")
+    shutil.copy(DB_SOURCE, db_name)
+
+    try:
+        apply_migrations(db_name)
+        user = User("Bench", "bench@example.com", "2000-01-01", 70, 175, "M", "M", 1.2)
+        nutrition = Nutrition(user, db_name)
+
+        print(f"{'NUTRITION rows':>15}{'add, us':>12}{'remove, us':>14}")
+        loaded = 0
+        for size in SIZES:
+            if size > max_rows:
+                break
+
+            DBControl.insert_many(db_name, "NUTRITION", nutrition.nutrition_columns, history_rows(loaded, size - loaded))
+            loaded = size
+            # write the bulk load out of the WAL, so its checkpoint is not counted in the first adds
+            DBControl.connect(db_name).execute("PRAGMA wal_checkpoint(TRUNCATE);")
+
+            add_time, remove_time = time_operations(nutrition)
+            print(f"{size:>15}{add_time * 1e6:>12.1f}{remove_time * 1e6:>14.1f}")
+    finally:
+        DBControl.close_all()
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import random
+import sys
+import time
+
+from calorie_counting import calculate_norms
+from cohort_norms import calculate_norms_batch, check_against_scalar, np
+
+# Compares norms of a synthetic cohort calculated one user at a time (calculate_norms without its cache)
+# with calculate_norms_batch, and checks that both give the same numbers.
+#
+#       python -m benchmarks.bench_cohort_norms             (1M users)
+#       python -m benchmarks.bench_cohort_norms 100000
+
+USERS = 1000000
+
+
+def synthetic_cohort(count, seed=12):
+    # Deterministic column lists of users
+    rng = random.Random(seed)
+    weights = [rng.randint(40, 150) for _ in range(count)]
+    heights = [rng.randint(140, 210) for _ in range(count)]
+    ages = [rng.randint(16, 90) for _ in range(count)]
+    sexes = [rng.choice("MF") for _ in range(count)]
+    goals = [rng.choice("LMG") for _ in range(count)]
+    activity_factors = [rng.choice((1.2, 1.375, 1.55, 1.725, 1.9)) for _ in range(count)]
+    return weights, heights, ages, sexes, goals, activity_factors
+
+
+def main():
+    if np is None:
+        print("numpy is not installed, nothing to compare")
+        return
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else USERS
+    columns = synthetic_cohort(count)
+
+    start = time.perf_counter()
+    for row in zip(*columns):
+        calculate_norms.__wrapped__(*row)
+    scalar_time = time.perf_counter() - start
+
+    arrays = [np.asarray(column) for column in columns]
+    start = time.perf_counter()
+    norms = calculate_norms_batch(*arrays)
+    batch_time = time.perf_counter() - start
+
+    different = check_against_scalar(*columns, norms)
+
+    print(f"users:          {count}")
+    print(f"scalar:         {scalar_time:.3f} s")
+    print(f"numpy batch:    {batch_time:.3f} s   ({scalar_time / batch_time:.1f}x)")
+    print(f"different rows: {len(different)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from DB_control import DBControl
+
+# Compares calls per second of DBControl.receive_data / data_exists with a connection
+# opened and closed on every call (old behaviour) and with the shared per-thread connection.
+# The benchmark works on a copy of Health_database.db, so the real file is never touched.
+#
+#       python -m benchmarks.bench_connections
+
+DB_SOURCE = "Health_database.db"
+CALLS = 2000
+
+
+def receive_data_reconnect(file_name, table_name, columns_name, object_condition=""):
+    # Old receive_data: connect, query, close
+    sql = f"SELECT {columns_name} FROM {table_name}"
+    if object_condition:
+        sql += f" WHERE {object_condition}"
+
+    conn = sqlite3.connect(file_name)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def data_exists_reconnect(file_name, table_name, columns_name, object_condition=""):
+    # Old data_exists: connect, query, close
+    sql = f"SELECT {columns_name} FROM {table_name} WHERE {object_condition} LIMIT 1;"
+
+    conn = sqlite3.connect(file_name)
+    try:
+        return conn.execute(sql).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def calls_per_second(function, db_name, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        function(db_name, "PRODUCTS", "*", "PRODUCT = 'Carrot'")
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    temp_dir = tempfile.mkdtemp()
+    db_name = os.path.join(temp_dir, "bench.db")
+    shutil.copy(DB_SOURCE, db_name)
+
+    try:
+        cases = [
+            ("receive_data", receive_data_reconnect, DBControl.receive_data),
+            ("data_exists", data_exists_reconnect, DBControl.data_exists),
+        ]
+
+        print(f"{'function':<15}{'before, calls/s':>18}{'after, calls/s':>18}{'speedup':>10}")
+        for name, before_function, after_function in cases:
+            before = calls_per_second(before_function, db_name, CALLS)
+            after = calls_per_second(after_function, db_name, CALLS)
+            print(f"{name:<15}{before:>18.0f}{after:>18.0f}{after / before:>9.1f}x")
+    finally:
+        DBControl.close_all()
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from DB_control import DBControl
+from benchmarks.run import summarize
+from nutrition import Nutrition
+from product_search import ProductSearchIndex
+from user import User
+
+# Times every keystroke of typing product names into the search index of a synthetic catalog,
+# with exact names and names with a typo (one letter swapped, dropped or doubled).
+#
+#       python -m benchmarks.bench_product_search               (100k products, in-memory index)
+#       python -m benchmarks.bench_product_search --products 50000
+#       python -m benchmarks.bench_product_search --fts         (Nutrition.search_products on PRODUCTS_FTS)
+#
+# ranking check: the exact name is found first in a big catalog of names that contain it, even when
+# it is inserted last (exit code 1 if not)
+#       python -m benchmarks.bench_product_search --check [--fts]
+#
+# the target is a median and p95 of a keystroke under 5 ms for 100k products
+
+PRODUCTS = 100000
+TYPED_NAMES = 200
+LIMIT = 50
+
+STYLES = ["boiled", "baked", "fried", "grilled", "raw", "smoked", "dried", "frozen", "canned", "steamed",
+          "roasted", "salted", "pickled", "fresh", "organic", "low fat", "sweet", "spicy", "whole", "sliced"]
+FOODS = ["chicken breast", "beef", "pork loin", "salmon", "tuna", "cod", "shrimp", "turkey", "egg", "tofu",
+         "rice", "buckwheat", "oatmeal", "pasta", "bread", "potato", "carrot", "broccoli", "tomato", "cucumber",
+         "apple", "banana", "orange", "pear", "grape", "strawberry", "blueberry", "cherry", "peach", "mango",
+         "cheese", "yogurt", "milk", "kefir", "butter", "cottage cheese", "almonds", "walnuts", "peanuts", "beans",
+         "lentils", "chickpeas", "peas", "corn", "spinach", "cabbage", "onion", "garlic", "pepper", "mushrooms"]
+BRANDS = ["Acme", "Farmhouse", "Green Valley", "Sunny", "Nordic", "Golden", "Happy Cow", "Ocean", "Prime",
+          "Village", "Harvest", "Alpine", "Royal", "Daily", "Natura", "Bio Land", "Market", "Classic", "Select",
+          "Homemade", "Northern", "Riverside", "Meadow", "Summit", "Heritage"]
+
+
+def synthetic_names(count, seed=21):
+    # count unique product names like "Green Valley grilled chicken breast 250 g"
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add(f"{rng.choice(BRANDS)} {rng.choice(STYLES)} {rng.choice(FOODS)} {rng.choice((100, 150, 200, 250, 300, 500, 1000))} g")
+    return sorted(names)
+
+
+def with_typo(text, rng):
+    i = rng.randrange(1, len(text) - 1)
+    typo = rng.choice(("swap", "drop", "double"))
+    if typo == "swap":
+        return text[:i - 1] + text[i] + text[i - 1] + text[i + 1:]
+    if typo == "drop":
+        return text[:i] + text[i + 1:]
+    return text[:i] + text[i] + text[i:]
+
+
+def typed_queries(names, count, seed=22):
+    # Every prefix of the typed text, as the combobox sees it after each key
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        # the food words, not the brand, the way people usually type
+        text = rng.choice(names).split(" ", 2)[-1] if rng.random() < 0.5 else rng.choice(names)
+        text = text[:rng.randint(4, 24)]
+        if rng.random() < 0.5:
+            text = with_typo(text, rng)
+        queries.extend(text[:length] for length in range(1, len(text) + 1))
+    return queries
+
+
+def time_keystrokes(search, queries):
+    # Seconds of every search and the number of searches without results
+    times = []
+    empty = 0
+    for query in queries:
+        start = time.perf_counter()
+        found = search(query, LIMIT)
+        times.append(time.perf_counter() - start)
+        empty += not found
+    return times, empty
+
+
+def ranking_cases(names):
+    # Catalog with many names that contain "apple" and the exact "Apple" at the end, and (query, expected first name)
+    catalog = list(names) + [f"Brand{i} apple pie" for i in range(1000)] + ["Apple"]
+    return catalog, [("apple", "Apple"), ("Apple", "Apple"), ("appl", "Apple"), ("brand999 apple", "Brand999 apple pie")]
+
+
+def check_ranking(search, cases):
+    # Names of the failed cases, the first found name must be the expected one
+    failed = []
+    for query, expected in cases:
+        found = search(query, LIMIT)
+        if not found or found[0] != expected:
+            failed.append(f"{query!r}: expected {expected!r} first, got {found[:3]}")
+    return failed
+
+
+def fts_search(names, temp_dir):
+    # search_products of Nutrition on a temporary database with the catalog, returns (search, build seconds)
+    db_name = os.path.join(temp_dir, "products.db")
+    user = User("bench", "bench", "1990-01-01", 75, 180, "M", "M", 1.55)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        nutrition = Nutrition(user, db_name)
+    DBControl.insert_many(db_name, "PRODUCTS", ["PRODUCT", "PROTEINS", "FATS", "CARBOHYDRATES", "KCAL"],
+                          [(name, 10, 5, 20, 165) for name in names])
+    if not nutrition.products_fts:
+        print("sqlite has no FTS5, the in-memory index is timed instead")
+    return nutrition.search_products, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keystroke latency of the product search")
+    parser.add_argument("--products", type=int, default=PRODUCTS)
+    parser.add_argument("--fts", action="store_true", help="search the full-text index of the database")
+    parser.add_argument("--check", action="store_true", help="check the ranking of exact names instead of timing")
+    args = parser.parse_args()
+
+    names = synthetic_names(args.products)
+    queries = typed_queries(names, TYPED_NAMES)
+    if args.check:
+        names, cases = ranking_cases(names)
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        if args.fts:
+            search, build_time = fts_search(names, temp_dir)
+        else:
+            start = time.perf_counter()
+            search = ProductSearchIndex(names).search
+            build_time = time.perf_counter() - start
+        if args.check:
+            failed = check_ranking(search, cases)
+        else:
+            times, empty = time_keystrokes(search, queries)
+    finally:
+        DBControl.close_all()
+        shutil.rmtree(temp_dir)
+
+    if args.check:
+        for failure in failed:
+            print(f"[ERROR] {failure}")
+        print(f"ranking check: {len(cases) - len(failed)} of {len(cases)} passed")
+        sys.exit(1 if failed else 0)
+
+    stats = summarize(times)
+    print(f"products:       {args.products}")
+    print(f"index build:    {build_time:.2f} s")
+    print(f"keystrokes:     {len(queries)} ({empty} without results)")
+    print(f"median:         {stats['median_us'] / 1000:.2f} ms")
+    print(f"p95:            {stats['p95_us'] / 1000:.2f} ms")
+    print(f"max:            {max(times) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+
+from DB_control import DBControl
+
+# Compares repeated CONSUMED lookups built with f-strings (a new SQL text for every value,
+# so sqlite parses and plans each one) against one query template with bind parameters
+# (parsed once, then taken from the prepared statement cache). A run with the statement
+# cache switched off shows how much of the gain comes from the cache itself.
+#
+#       python -m benchmarks.bench_statements
+
+DB_SOURCE = "Health_database.db"
+LOOKUPS = 20000
+DAYS = 365
+
+
+def lookup_dates():
+    today = date.today()
+    return [(today - timedelta(days=i % DAYS)).isoformat() for i in range(LOOKUPS)]
+
+
+def run_formatted(db_name, dates):
+    start = time.perf_counter()
+    for day in dates:
+        DBControl.receive_data(db_name, "CONSUMED", "TOTAL_KCAL", f"USER = 'TestUser' AND DATE = '{day}'")
+    return time.perf_counter() - start
+
+
+def run_parameterized(db_name, dates):
+    start = time.perf_counter()
+    for day in dates:
+        DBControl.receive_data(db_name, "CONSUMED", "TOTAL_KCAL", "USER = ? AND DATE = ?", ("TestUser", day))
+    return time.perf_counter() - start
+
+
+def main():
+    temp_dir = tempfile.mkdtemp()
+    db_name = os.path.join(temp_dir, "bench.db")
+    shutil.copy(DB_SOURCE, db_name)
+    dates = lookup_dates()
+
+    try:
+        results = []
+        for cache_size in (128, 0):
+            DBControl.set_statement_cache_size(cache_size)
+            DBControl.receive_data(db_name, "CONSUMED", "TOTAL_KCAL")  # open connection outside the timing
+            results.append((f"f-string, cache={cache_size}", run_formatted(db_name, dates)))
+            results.append((f"bind params, cache={cache_size}", run_parameterized(db_name, dates)))
+
+        baseline = results[0][1]
+        print(f"{LOOKUPS} lookups over {DAYS} distinct dates")
+        print(f"{'variant':<26}{'total, ms':>12}{'per lookup, us':>18}{'vs f-string':>14}")
+        for name, elapsed in results:
+            print(f"{name:<26}{elapsed * 1000:>12.1f}{elapsed / LOOKUPS * 1e6:>18.2f}{baseline / elapsed:>13.2f}x")
+    finally:
+        DBControl.close_all()
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
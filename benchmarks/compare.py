@@ -0,0 +1,69 @@
+import argparse
+import json
+import sys
+
+# Compares two result files of benchmarks.run by the median time of one call,
+# exits with code 1 if a benchmark is slower than the threshold (percent)
+#
+#       python -m benchmarks.compare base.json new.json
+#       python -m benchmarks.compare base.json new.json --threshold 20 --metric p95_us
+
+
+def compare_results(base, new, threshold=10.0, metric="median_us"):
+    # List of (name, base value, new value, change percent, status), status is ok, faster, REGRESSION,
+    # new or missing
+    rows = []
+    base_results = base["results"]
+    new_results = new["results"]
+
+    for name in sorted(base_results.keys() | new_results.keys()):
+        if name not in new_results:
+            rows.append((name, base_results[name][metric], None, None, "missing"))
+            continue
+        if name not in base_results:
+            rows.append((name, None, new_results[name][metric], None, "new"))
+            continue
+
+        base_value = base_results[name][metric]
+        new_value = new_results[name][metric]
+        change = (new_value - base_value) / base_value * 100 if base_value else 0.0
+        if change > threshold:
+            status = "REGRESSION"
+        elif change < -threshold:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((name, base_value, new_value, change, status))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown, percent")
+    parser.add_argument("--metric", default="median_us", choices=["mean_us", "median_us", "p95_us", "min_us"])
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as file:
+        base = json.load(file)
+    with open(args.new, encoding="utf-8") as file:
+        new = json.load(file)
+
+    rows = compare_results(base, new, args.threshold, args.metric)
+    print(f"{'benchmark':<40}{'base':>12}{'new':>12}{'change':>10}  status")
+    for name, base_value, new_value, change, status in rows:
+        base_str = f"{base_value:.1f}" if base_value is not None else "-"
+        new_str = f"{new_value:.1f}" if new_value is not None else "-"
+        change_str = f"{change:+.1f}%" if change is not None else "-"
+        print(f"{name:<40}{base_str:>12}{new_str:>12}{change_str:>10}  {status}")
+
+    regressions = [row[0] for row in rows if row[4] == "REGRESSION"]
+    if regressions:
+        print(f"\n{len(regressions)} regressions over {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nNo regressions over {args.threshold}%")
+
+
+if __name__ == "__main__":
+    main()
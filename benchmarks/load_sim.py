@@ -0,0 +1,209 @@
+import argparse
+import contextlib
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from DB_control import DBControl
+from benchmarks.synthetic import generate_database, product_name, user_email, user_name
+from calorie_counting import CalorieCounting
+from nutrition import Nutrition
+from user import User
+
+# Many clients play user sessions against one database file at the same time, through Nutrition and
+# CalorieCounting like the app does: products are added and removed, the day is shown, statistics are
+# opened and norms are checked. Throughput, p50/p95/p99 latency per action and lock retries are reported,
+# so lock settings of DBControl can be compared.
+#
+#       python -m benchmarks.load_sim --clients 8 --duration 10
+#       python -m benchmarks.load_sim --clients 8 --mode process --busy-timeout 0.05 --retries 10 --backoff 0.01
+#       python -m benchmarks.load_sim --clients 8 --busy-timeout 0.05 --retries 0       (errors without retries)
+#
+# the database is a synthetic one in a temporary directory (see benchmarks.synthetic)
+
+# action: weight in a session
+ACTIONS = {
+    "add_product": 40,
+    "remove_product": 20,
+    "show_today": 15,
+    "statistics": 15,
+    "update_norm": 10,
+}
+PERIODS = ["week", "month", "halfyear", "year"]
+
+
+def run_session(db_name, client, duration, think_ms, seed):
+    # Play one user session for duration seconds, returns ({action: [seconds]}, lock stats, failed actions)
+    rng = random.Random(seed + client)
+    user = User(user_name(client), user_email(client), "1990-01-01", 75, 180, "M", "M", 1.55)
+    nutrition = Nutrition(user, db_name)
+    calorie_counter = CalorieCounting(user, db_name)
+    added = []
+
+    def add_product():
+        product, mass = product_name(rng.randrange(50)), rng.randint(20, 400)
+        nutrition.add_consumed_product(product, mass)
+        added.append((product, float(mass)))
+
+    def remove_product():
+        if added:
+            nutrition.remove_consumed_product(*added.pop(rng.randrange(len(added))))
+
+    def update_norm():
+        calorie_counter.stored_norm = None
+        calorie_counter.update_norm_if_needed(db_name)
+
+    functions = {
+        "add_product": add_product,
+        "remove_product": remove_product,
+        "show_today": nutrition.show_today_consumption,
+        "statistics": lambda: calorie_counter.get_summary_table_data(rng.choice(PERIODS)),
+        "update_norm": update_norm,
+    }
+    names = list(ACTIONS)
+    weights = [ACTIONS[name] for name in names]
+    latencies = {name: [] for name in names}
+    errors = 0
+
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            functions[name]()
+        except Exception:
+            errors += 1
+        latencies[name].append(time.perf_counter() - start)
+        if think_ms:
+            time.sleep(rng.uniform(0, think_ms) / 1000)
+
+    return latencies, errors
+
+
+def _process_client(args):
+    # Client in a pool process, the lock settings are set again because the process is new
+    db_name, client, duration, think_ms, seed, busy_timeout, retries, backoff = args
+    DBControl.set_lock_policy(busy_timeout, retries, backoff)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        latencies, errors = run_session(db_name, client, duration, think_ms, seed)
+    stats = DBControl.lock_stats()
+    DBControl.close_all()
+    return latencies, errors, stats
+
+
+def run_threads(db_name, clients, duration, think_ms, seed):
+    results = [None] * clients
+
+    def client_thread(client):
+        results[client] = run_session(db_name, client, duration, think_ms, seed)
+
+    threads = [threading.Thread(target=client_thread, args=(client,)) for client in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [(latencies, errors, None) for latencies, errors in results]
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def simulate(db_name, clients=4, duration=5.0, mode="thread", think_ms=0, seed=1,
+             busy_timeout=5.0, retries=3, backoff=0.05):
+    # Run the clients, returns dictionary with throughput, latency percentiles (ms) and lock statistics
+    DBControl.set_lock_policy(busy_timeout, retries, backoff)
+    DBControl.reset_lock_stats()
+
+    start = time.perf_counter()
+    if mode == "process":
+        tasks = [(db_name, client, duration, think_ms, seed, busy_timeout, retries, backoff) for client in range(clients)]
+        with multiprocessing.get_context("spawn").Pool(clients) as pool:
+            results = pool.map(_process_client, tasks)
+    else:
+        # the app prints debug output and swallowed errors, they are not needed here
+        # (stdout is replaced once for all threads, it is a global of the process)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            results = run_threads(db_name, clients, duration, think_ms, seed)
+    elapsed = time.perf_counter() - start
+
+    lock_stats = DBControl.lock_stats()
+    all_latencies = {name: [] for name in ACTIONS}
+    errors = 0
+    for latencies, client_errors, client_stats in results:
+        for name, values in latencies.items():
+            all_latencies[name].extend(values)
+        errors += client_errors
+        if client_stats:
+            lock_stats["retries"] += client_stats["retries"]
+            lock_stats["failures"] += client_stats["failures"]
+
+    report = {"clients": clients, "mode": mode, "seconds": elapsed, "errors": errors, "lock": lock_stats, "actions": {}}
+    total = []
+    for name, values in all_latencies.items():
+        ordered = sorted(values)
+        total.extend(values)
+        report["actions"][name] = {
+            "count": len(values),
+            "p50_ms": percentile(ordered, 0.50) * 1000,
+            "p95_ms": percentile(ordered, 0.95) * 1000,
+            "p99_ms": percentile(ordered, 0.99) * 1000
+        }
+
+    total.sort()
+    report["operations"] = len(total)
+    report["throughput"] = len(total) / elapsed if elapsed else 0
+    report["p50_ms"] = percentile(total, 0.50) * 1000
+    report["p95_ms"] = percentile(total, 0.95) * 1000
+    report["p99_ms"] = percentile(total, 0.99) * 1000
+    return report
+
+
+def print_report(report):
+    print(f"{'action':<18}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, values in report["actions"].items():
+        print(f"{name:<18}{values['count']:>8}{values['p50_ms']:>10.2f}{values['p95_ms']:>10.2f}{values['p99_ms']:>10.2f}")
+    print(f"{'all':<18}{report['operations']:>8}{report['p50_ms']:>10.2f}{report['p95_ms']:>10.2f}{report['p99_ms']:>10.2f}")
+    print(f"\nClients:        {report['clients']} ({'processes' if report['mode'] == 'process' else 'threads'})")
+    print(f"Throughput:     {report['throughput']:.1f} operations/s")
+    print(f"Lock retries:   {report['lock']['retries']}")
+    print(f"Lock failures:  {report['lock']['failures']}")
+    print(f"Raised errors:  {report['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent user sessions against one database file")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of every session")
+    parser.add_argument("--mode", default="thread", choices=["thread", "process"])
+    parser.add_argument("--think-ms", type=float, default=0, help="maximum pause between actions")
+    parser.add_argument("--busy-timeout", type=float, default=5.0, help="seconds")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.05, help="first retry delay, seconds")
+    parser.add_argument("--days", type=int, default=90, help="days of synthetic history of every user")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    db_name = os.path.join(temp_dir, "load.db")
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            generate_database(db_name, users=args.clients, days=args.days, products=200, pictures=0, seed=args.seed)
+        DBControl.close_all()
+
+        report = simulate(db_name, args.clients, args.duration, args.mode, args.think_ms, args.seed,
+                          args.busy_timeout, args.retries, args.backoff)
+        print_report(report)
+    finally:
+        DBControl.close_all()
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from DB_control import DBControl
+from benchmarks.synthetic import generate_database, product_name, user_email, user_name
+from calorie_counting import CalorieCounting
+from nutrition import Nutrition
+from totals_cache import totals_cache
+from user import User
+
+# Times the core paths of the app on a synthetic database and writes the results as JSON,
+# compare two result files with benchmarks.compare
+#
+#       python -m benchmarks.run --output results.json
+#       python -m benchmarks.run --users 50 --days 730 --repeat 500 --output big.json
+#
+# every benchmark is called "repeat" times, the JSON has mean, median, p95 and min time of one call (us)
+
+SUMMARY_PERIODS = ["week", "month", "halfyear", "year", "alltime"]
+
+
+def time_calls(function, repeat):
+    # Call function(i) repeat times, returns list of seconds of each call
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(i)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summarize(times):
+    ordered = sorted(times)
+    return {
+        "calls": len(times),
+        "mean_us": statistics.fmean(times) * 1e6,
+        "median_us": statistics.median(ordered) * 1e6,
+        "p95_us": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1e6,
+        "min_us": ordered[0] * 1e6
+    }
+
+
+def run_benchmarks(db_name, repeat, pictures):
+    # Dictionary {benchmark name: statistics}
+    user = User(user_name(0), user_email(0), "1990-01-01", 75, 180, "M", "M", 1.55)
+    nutrition = Nutrition(user, db_name)
+    calorie_counter = CalorieCounting(user, db_name)
+
+    benchmarks = {
+        "add_consumed_product": lambda i: nutrition.add_consumed_product(product_name(i % 50), 100 + i),
+        "remove_consumed_product": lambda i: nutrition.remove_consumed_product(product_name(i % 50), float(100 + i)),
+        "show_today_consumption": lambda i: nutrition.show_today_consumption(),
+    }
+    for period in SUMMARY_PERIODS:
+        benchmarks[f"get_summary_table_data[{period}]"] = lambda i, period=period: calorie_counter.get_summary_table_data(period)
+
+    def update_norm(i):
+        # the check of the day is remembered by the object, it is forgotten to time the real work
+        calorie_counter.stored_norm = None
+        calorie_counter.update_norm_if_needed(db_name)
+
+    benchmarks["update_norm_if_needed"] = update_norm
+    benchmarks["get_product_image"] = lambda i: nutrition.get_product_image(product_name(i % max(pictures, 1)))
+    benchmarks["probe_product_image"] = lambda i: nutrition.probe_product_image(product_name(i % max(pictures, 1)))
+    # the first call of every product makes its thumbnail, the next ones read it
+    benchmarks["get_product_thumbnail"] = lambda i: nutrition.get_product_thumbnail(product_name(i % max(pictures, 1)))
+
+    results = {}
+    for name, function in benchmarks.items():
+        totals_cache.clear()
+        # debug output of the app is part of the timed paths, but it is not printed
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            times = time_calls(function, repeat)
+        results[name] = summarize(times)
+        print(f"{name:<40}{results[name]['median_us']:>12.1f} us", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the core paths on a synthetic database")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--pictures", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    db_name = os.path.join(temp_dir, "bench.db")
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            data = generate_database(db_name, args.users, args.days, args.products, args.pictures, seed=args.seed)
+        results = run_benchmarks(db_name, args.repeat, args.pictures)
+    finally:
+        DBControl.close_all()
+        shutil.rmtree(temp_dir)
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "data": data
+        },
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results saved to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
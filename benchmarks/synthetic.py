@@ -0,0 +1,141 @@
+import argparse
+import random
+import struct
+import zlib
+from datetime import date, timedelta
+
+from DB_control import DBControl
+from migrations import apply_migrations
+
+# Deterministic synthetic database for the benchmarks: the same parameters and seed always give the same
+# rows. Users, days of history, products and pictures can be scaled independently. NUTRITION rows are
+# inserted through the normal triggers, so CONSUMED, the rollups and NORM_HISTORY look like real ones.
+#
+#       from benchmarks.synthetic import generate_database
+#       info = generate_database("/tmp/bench.db", users=50, days=730, products=1000, pictures=200)
+#
+#       python -m benchmarks.synthetic /tmp/bench.db --users 50 --days 730 --products 1000 --pictures 200
+
+NUTRITION_COLUMNS = ["USER", "DATE", "PRODUCT", "CONSUMED_MASS", "CONSUMED_PROTEINS", "CONSUMED_FATS",
+                     "CONSUMED_CARBOHYDRATES", "CONSUMED_KCAL"]
+
+
+def png_bytes(width, height, color):
+    # Minimal PNG (8 bit RGB, no filter) filled with a vertical gradient of the color
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    red, green, blue = color
+    rows = bytearray()
+    for y in range(height):
+        shade = y * 255 // max(height - 1, 1)
+        rows.append(0)
+        rows.extend(bytes(((red + shade) // 2, (green + shade) // 2, (blue + shade) // 2)) * width)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(bytes(rows))) + chunk(b"IEND", b"")
+
+
+def product_name(index):
+    return f"Product {index:05d}"
+
+
+def user_name(index):
+    return f"User {index:05d}"
+
+
+def user_email(index):
+    # rows of a user are keyed by the email, the name is only shown
+    return f"user{index:05d}@example.com"
+
+
+def iter_products(rng, count):
+    for i in range(count):
+        proteins = round(rng.uniform(0, 30), 1)
+        fats = round(rng.uniform(0, 40), 1)
+        carbohydrates = round(rng.uniform(0, 80), 1)
+        kcal = int(proteins * 4 + fats * 9 + carbohydrates * 4)
+        yield product_name(i), proteins, fats, carbohydrates, kcal
+
+
+def iter_users(rng, count):
+    for i in range(count):
+        birth_date = date(rng.randint(1950, 2008), rng.randint(1, 12), rng.randint(1, 28)).isoformat()
+        yield (user_email(i), "password", user_name(i), birth_date, rng.randint(45, 130), rng.randint(150, 205),
+               rng.choice("MF"), rng.choice("LMG"), "standard", rng.choice((1.2, 1.55, 1.9)))
+
+
+def iter_nutrition(rng, products, users, days, entries_per_day, end_date):
+    # Rows of NUTRITION, values are calculated as in Nutrition.add_consumed_product
+    first_day = end_date - timedelta(days=days - 1)
+    for user_index in range(users):
+        for day in range(days):
+            day_str = (first_day + timedelta(days=day)).isoformat()
+            for _ in range(rng.randint(max(entries_per_day - 2, 0), entries_per_day + 2)):
+                product, proteins, fats, carbohydrates, kcal = products[rng.randrange(len(products))]
+                mass = float(rng.randint(20, 400))
+                yield (user_email(user_index), day_str, product, round(mass, 2),
+                       round((proteins / 100) * mass, 2), round((fats / 100) * mass, 2),
+                       round((carbohydrates / 100) * mass, 2), round((kcal / 100) * mass, 2))
+
+
+def iter_norm_history(rng, users, days, end_date):
+    # A norm change about every three months of history
+    first_day = end_date - timedelta(days=days - 1)
+    for user_index in range(users):
+        day = 0
+        while day < days:
+            kcal = rng.randint(1500, 3200)
+            yield (user_email(user_index), (first_day + timedelta(days=day)).isoformat(),
+                   round(kcal * 0.3 / 4, 1), round(kcal * 0.3 / 9, 1), round(kcal * 0.4 / 4, 1), kcal)
+            day += rng.randint(60, 120)
+
+
+def generate_database(path, users=10, days=365, products=500, pictures=100, entries_per_day=5,
+                      picture_size=64, seed=42, end_date=None):
+    # Create the database file with synthetic data, returns dictionary of parameters and row counts
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    apply_migrations(path)
+
+    product_rows = list(iter_products(rng, products))
+    DBControl.insert_many(path, "PRODUCTS", ["PRODUCT", "PROTEINS", "FATS", "CARBOHYDRATES", "KCAL"], product_rows)
+
+    picture_rows = (
+        (product_rows[i][0], png_bytes(picture_size, picture_size, (rng.randrange(256), rng.randrange(256), rng.randrange(256))))
+        for i in range(min(pictures, products))
+    )
+    DBControl.insert_many(path, "PICTURES", ["PRODUCT", "IMAGE"], picture_rows)
+
+    DBControl.insert_many(path, "USERS", ["EMAIL", "PASSWORD", "NAME", "BIRTH_DATE", "WEIGHT", "HEIGHT", "SEX",
+                                          "GOAL", "BJV_MODE", "ACTIVITY_FACTOR"], iter_users(rng, users))
+    DBControl.insert_many(path, "NORM_HISTORY", ["USER", "EFFECTIVE_FROM", "NORM_PROTEINS", "NORM_FATS",
+                                                 "NORM_CARBOHYDRATES", "NORM_KCAL"], iter_norm_history(rng, users, days, end_date))
+    DBControl.insert_many(path, "NUTRITION", NUTRITION_COLUMNS,
+                          iter_nutrition(rng, product_rows, users, days, entries_per_day, end_date))
+
+    counts = {
+        table: DBControl.query_data(path, f"SELECT COUNT(*) FROM {table};")[0][0]
+        for table in ("PRODUCTS", "PICTURES", "USERS", "NUTRITION", "CONSUMED", "NORM_HISTORY")
+    }
+    return {
+        "users": users, "days": days, "products": products, "pictures": pictures,
+        "entries_per_day": entries_per_day, "seed": seed, "end_date": end_date.isoformat(), "rows": counts
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create a synthetic database for the benchmarks")
+    parser.add_argument("path")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--pictures", type=int, default=100)
+    parser.add_argument("--entries-per-day", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    info = generate_database(args.path, args.users, args.days, args.products, args.pictures,
+                             args.entries_per_day, seed=args.seed)
+    for table, count in info["rows"].items():
+        print(f"{table:<15}{count:>10}")
@@ -1,6 +1,7 @@
 import customtkinter as ctk
 from calorie_counting import CalorieCounting
 from bmi_statistics_window import StatisticsWindow
+from db_worker import deliver
 
 class BMICalculator(ctk.CTkFrame):
     def __init__(self, master, user):
@@ -21,12 +22,19 @@ class BMICalculator(ctk.CTkFrame):
         self.create_main_buttons()
 
     def update_circles(self):
+        """Load consumed values in the background DB worker and redraw circles when they are ready"""
+        consumed_future = self.calorie_counter.get_consumed_nutrition_async()
+        percentages_future = self.calorie_counter.get_nutrition_percentage_async()
+
+        # the worker runs tasks in order, so consumed values are ready together with percentages
+        deliver(self, percentages_future, lambda percentages: self.draw_circles(consumed_future.result(), percentages))
+
+    def draw_circles(self, consumed, percentages):
+        """Draw circles for already loaded consumed values and percentages"""
         for widget in self.circle_frame.winfo_children():
             widget.destroy()
 
-        consumed = self.calorie_counter.get_consumed_nutrition()
         norm_protein, norm_fat, norm_carbs, norm_calories = self.calorie_counter.get_norm()
-        percentages = self.calorie_counter.get_nutrition_percentage()
 
         canvas_data = [
             (percentages['calories_percent'], "Calories", "", f"{int(consumed[3])} / {int(norm_calories)}"),
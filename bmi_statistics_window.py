@@ -1,12 +1,16 @@
 import customtkinter as ctk
 from tkinter import ttk
 from calorie_counting import CalorieCounting
+from db_worker import deliver
+from analytics import get_analytics, format_summary
 
 class StatisticsWindow(ctk.CTkToplevel, CalorieCounting):
     def __init__(self, parent, calorie_counter):
         super().__init__(parent)
         self.parent = parent
         self.calorie_counter = calorie_counter
+        self.fill_request = 0
+        self.current_period = "week"
 
         self.setup_window()
         self.create_widgets()
@@ -36,10 +40,13 @@ class StatisticsWindow(ctk.CTkToplevel, CalorieCounting):
         self.period_options = {
             "Calories per week": "week",
             "Calories per month": "month",
-            "Calories per half year": "halfyear"
+            "Calories per half year": "halfyear",
+            "Calories per year": "year",
+            "Calories for all time": "alltime"
         }
 
         self.dropdown = self.create_dropdown()
+        self.analytics_label = self.create_analytics_label()
         self.table = self.create_table(period="week")
 
         self.create_buttons()
@@ -84,6 +91,21 @@ class StatisticsWindow(ctk.CTkToplevel, CalorieCounting):
         dropdown.pack(pady=10)
         return dropdown
 
+    def create_analytics_label(self):
+        """Create the label with moving averages, streaks and week-over-week deltas"""
+        label = ctk.CTkLabel(
+            self.main_frame,
+            text="Loading analytics...",
+            text_color="black",
+            font=("Inter", 14),
+            justify="left"
+        )
+        label.pack(pady=(0, 5))
+
+        analytics = get_analytics(self.calorie_counter)
+        deliver(self, analytics.refresh_async(), lambda summary: label.configure(text="\n".join(format_summary(summary))))
+        return label
+
     def create_table(self, period="week"):
         """Create table with calorie statistics"""
         self.table_frame = ctk.CTkFrame(self.main_frame, fg_color="white")
@@ -121,14 +143,23 @@ class StatisticsWindow(ctk.CTkToplevel, CalorieCounting):
         return table
 
     def fill_table(self, table, period):
-        """Fill table with data from the calorie counter"""
-        rows = self.calorie_counter.get_summary_table_data(period)
-        for row in rows:
-            table.insert("", "end", values=row)
+        """Fill table with data from the calorie counter, data is loaded in the background DB worker"""
+        self.fill_request += 1
+        request = self.fill_request
+
+        def insert_rows(rows):
+            # skip result of the period that was already changed in the dropdown
+            if request != self.fill_request:
+                return
+            for row in rows:
+                table.insert("", "end", values=row)
+
+        deliver(self, self.calorie_counter.get_summary_table_data_async(period), insert_rows)
 
     def update_table(self, selected_label):
         """Clear and refill table based on selected dropdown option"""
         period = self.period_options[selected_label]
+        self.current_period = period
         self.table.delete(*self.table.get_children())
         self.fill_table(self.table, period)
 
@@ -168,6 +199,6 @@ class StatisticsWindow(ctk.CTkToplevel, CalorieCounting):
             hover_color="#e03ebf",
             text_color="white",
             corner_radius=8,
-            command=lambda: self.calorie_counter.save_table_to_file(table=self.table)
+            command=lambda: self.calorie_counter.save_table_to_file(self, period=self.current_period)
         )
         button.pack(side="right", padx=20)
\ No newline at end of file
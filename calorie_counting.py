@@ -11,177 +11,167 @@
 #                         NORM_CARBOHYDRATES REAL NOT NULL,
 #                         NORM_KCAL INTEGER NOT NULL
 #                         );"""
-import csv
 from datetime import date, timedelta
-from tkinter import filedialog
+from functools import lru_cache
 
 from DB_control import DBControl
+from migrations import apply_migrations
+from db_worker import get_worker, deliver
+from totals_cache import totals_cache
+from export import export_summary
+from norm_history import get_norm_history
+from hot_queries import DAILY_TOTALS_SQL, DAILY_TOTALS_RANGE_SQL, FIRST_RECORD_DATE_SQL, ROLLUP_TOTALS_RANGE_SQL
+
+@lru_cache(maxsize=1024)
+def calculate_norms(weight, height, age, sex, goal, activity_factor):
+    """Calculate (bmr, total calories, (protein, fat, carb)) for the profile values.
+    Results are memoized, so repeated norm lookups of the same profile are dictionary hits"""
+    # Mifflin-St Jeor equation
+    if sex == 'M':
+        bmr = 10 * weight + 6.25 * height - 5 * age + 5
+    else:
+        bmr = 10 * weight + 6.25 * height - 5 * age - 161
+
+    total_calories = bmr * activity_factor
+
+    if goal == 'L':
+        total_calories -= 500
+    elif goal == 'G':
+        total_calories += 500
+
+    protein_ratio = 0.30
+    fat_ratio = 0.30
+    carb_ratio = 0.40
+
+    protein = total_calories * protein_ratio / 4
+    fat = total_calories * fat_ratio / 9
+    carb = total_calories * carb_ratio / 4
+
+    return bmr, total_calories, (round(protein, 1), round(fat, 1), round(carb, 1))
+
+
+# summary periods that are shown per week or month (read from the rollup tables) instead of per day
+SUMMARY_ROLLUPS = {
+    "halfyear": "week",
+    "year": "month",
+    "alltime": "month"
+}
+
 
 class CalorieCounting:
-    def __init__(self, user):
+    # rows of the user are keyed by user.email (primary key of USERS), the same as Nutrition writes them
+    def __init__(self, user, db_name="Health_database.db"):
         self.user = user
-        self.activity_factor = float(user.activity_factor)
-        self.goal = user.goal
-        self.norm_calories = self.calculate_total_calories()
-        self.norm_bjv = self.calculate_bjv()
-        self.db_name = "Health_database.db"
+        self.stored_norm = None
+        self.db_name = db_name
+        apply_migrations(self.db_name)
 
     def change_user_attribute(self, attr_name, new_value):
-        """Method to change user attribute and recalculate norms"""
+        """Method to change user attribute, norms are recalculated on the next lookup"""
+        if attr_name == "activity_factor":
+            new_value = float(new_value)
         setattr(self.user, attr_name, new_value)
-        self.norm_calories = self.calculate_total_calories()
-        self.norm_bjv = self.calculate_bjv()
+        self.stored_norm = None
+
+    def get_norm_values(self):
+        """Get memoized (bmr, total calories, (protein, fat, carb)) for the current profile and date.
+        The profile is read from the user on every call, so changes of User.update_profile are seen"""
+        return calculate_norms(
+            self.user.weight, self.user.height, self.user.get_age(),
+            self.user.sex, self.user.goal, float(self.user.activity_factor)
+        )
+
+    @property
+    def norm_calories(self):
+        return self.get_norm_values()[1]
+
+    @property
+    def norm_bjv(self):
+        return self.calculate_bjv()
 
     def calculate_bmr(self):
         """Method to calculate Basal Metabolic Rate (BMR)"""
-        if self.user.sex == 'M':
-            bmr = 10 * self.user.weight + 6.25 * self.user.height - 5 * self.user.get_age() + 5
-        else:
-            bmr = 10 * self.user.weight + 6.25 * self.user.height - 5 * self.user.get_age() - 161
-        return bmr
+        return self.get_norm_values()[0]
 
     def calculate_total_calories(self):
         """Method to calculate total daily caloric needs based on activity and goal"""
-        bmr = self.calculate_bmr()
-        total_calories = bmr * self.activity_factor
-
-        if self.goal == 'L':
-            total_calories -= 500
-        elif self.goal == 'G':
-            total_calories += 500
-
-        return total_calories
+        return self.get_norm_values()[1]
 
     def calculate_bjv(self):
         """Method to calculate daily nutrient targets"""
-        total_calories = self.calculate_total_calories()
-
-        protein_ratio = 0.30
-        fat_ratio = 0.30
-        carb_ratio = 0.40
-
-        protein = total_calories * protein_ratio / 4
-        fat = total_calories * fat_ratio / 9
-        carb = total_calories * carb_ratio / 4
+        protein, fat, carb = self.get_norm_values()[2]
 
         return {
-            "protein": round(protein, 1),
-            "fat": round(fat, 1),
-            "carb": round(carb, 1)
+            "protein": protein,
+            "fat": fat,
+            "carb": carb
         }
 
+    def get_stored_norm(self):
+        """Get the current norm in the stored form (protein, fat, carb, kcal as integer)"""
+        _, total_calories, (norm_protein, norm_fat, norm_carb) = self.get_norm_values()
+        return norm_protein, norm_fat, norm_carb, int(total_calories)
+
     def update_norm_if_needed(self, db_name):
-        """Method to update stored norm values in DB if they have changed"""
+        """Method to add the norm to the norm change log if it has changed"""
         current_date = date.today().isoformat()
-        norm_calories = int(self.calculate_total_calories())
-        bjv = self.calculate_bjv()
-
-        norm_protein = bjv['protein']
-        norm_fat = bjv['fat']
-        norm_carb = bjv['carb']
-
-        result = DBControl.receive_data(
-            file_name=db_name,
-            table_name="CONSUMED",
-            columns_name="NORM_PROTEINS, NORM_FATS, NORM_CARBOHYDRATES, NORM_KCAL",
-            object_condition=f"USER = '{self.user.name}' AND DATE = '{current_date}'"
-        )
+        norm = self.get_stored_norm()
 
-        if result:
-            stored_protein, stored_fat, stored_carb, stored_kcal = result[0]
-            if (
-                stored_protein != norm_protein or
-                stored_fat != norm_fat or
-                stored_carb != norm_carb or
-                stored_kcal != norm_calories
-            ):
-                print("[INFO] Norms changed - updating record.")
-                DBControl.update_data(
-                    file_name=db_name,
-                    table_name="CONSUMED",
-                    columns_array=["NORM_PROTEINS", "NORM_FATS", "NORM_CARBOHYDRATES", "NORM_KCAL"],
-                    values_array=[norm_protein, norm_fat, norm_carb, norm_calories],
-                    object_condition=f"USER = '{self.user.name}' AND DATE = '{current_date}'"
-                )
-            else:
-                print("[INFO] Norms unchanged - no update required.")
+        # the same norm was already checked today, there is nothing to update
+        stored_norm = (self.user.email, current_date, *norm)
+        if self.stored_norm == stored_norm:
+            return
+
+        if get_norm_history(db_name, self.user.email).record(current_date, norm):
+            print("[INFO] Norms changed - new change log record.")
         else:
-            print("[INFO] No data - creating a new record.")
-            insert_query = f"""
-                INSERT INTO CONSUMED 
-                (USER, DATE, NORM_PROTEINS, NORM_FATS, NORM_CARBOHYDRATES, NORM_KCAL,
-                 TOTAL_MASS, TOTAL_PROTEINS, TOTAL_FATS, TOTAL_CARBOHYDRATES, TOTAL_KCAL)
-                VALUES 
-                ('{self.user.name}', '{current_date}', {norm_protein}, {norm_fat}, {norm_carb}, {norm_calories},
-                 0, 0, 0, 0, 0);
-            """
-            DBControl.insert_data(db_name, insert_query)
-
-        # Output all CONSUMED rows for the user and date
-        print("\nCONSUMED:")
-        cons = DBControl.receive_data(
-            file_name=db_name,
-            table_name="CONSUMED",
-            columns_name="*",
-            object_condition=f"USER = '{self.user.name}' AND DATE = '{current_date}'"
-        )
-        for v in cons:
-            print(v)
+            print("[INFO] Norms unchanged - no update required.")
+
+        self.stored_norm = stored_norm
 
     def store_norm_to_db(self, db_name):
         """Store norms to DB (used on initial day setup)"""
-        current_date = date.today().isoformat()
-        norm_calories = int(self.calculate_total_calories())
-        bjv = self.calculate_bjv()
-        norm_protein = bjv['protein']
-        norm_fat = bjv['fat']
-        norm_carb = bjv['carb']
-
-        columns = [
-            "USER", "DATE",
-            "TOTAL_MASS", "TOTAL_PROTEINS", "TOTAL_FATS", "TOTAL_CARBOHYDRATES", "TOTAL_KCAL",
-            "NORM_PROTEINS", "NORM_FATS", "NORM_CARBOHYDRATES", "NORM_KCAL"
-        ]
-
-        values = [
-            f"'{self.user.name}'", f"'{current_date}'",
-            0, 0, 0, 0, 0,
-            norm_protein, norm_fat, norm_carb, norm_calories
-        ]
-
-        insert_sql = f"""
-            INSERT INTO CONSUMED ({', '.join(columns)})
-            VALUES ({', '.join(map(str, values))});
-        """
-        DBControl.insert_data(db_name, insert_sql)
+        get_norm_history(db_name, self.user.email).record(date.today(), self.get_stored_norm())
+
+    def get_norm_on(self, day):
+        """Get (protein, fat, carb, kcal) norm in effect on the day. Today and later it is the current norm,
+        past days are looked up in the norm change log (current norm if the log is empty)"""
+        if day >= date.today():
+            return self.get_stored_norm()
+        return get_norm_history(self.db_name, self.user.email).norm_on(day) or self.get_stored_norm()
 
     def get_daily_totals(self, db_name, target_date=None):
         """Get total consumption values for a specific date """
         if target_date is None:
-            target_date = date.today().isoformat()
+            target_date = date.today()
 
-        condition = f"USER = '{self.user.name}' AND DATE = '{target_date}'"
-        columns_name = "SUM(TOTAL_PROTEINS), SUM(TOTAL_FATS), SUM(TOTAL_CARBOHYDRATES), SUM(TOTAL_KCAL)"
-        results = DBControl.receive_data(db_name, "CONSUMED", columns_name, condition)
+        # days are kept in the shared cache, Nutrition updates them when products are added or removed
+        key = totals_cache.make_key(db_name, self.user.email, target_date)
+        totals = totals_cache.get(key)
+        if totals is not None:
+            return totals
+        generation = totals_cache.generation
+
+        results = DBControl.query_data(db_name, DAILY_TOTALS_SQL, (self.user.email, str(target_date)))
 
         if results and results[0] and any(results[0]):
             proteins = results[0][0] or 0
             fats = results[0][1] or 0
             carbs = results[0][2] or 0
             kcal = results[0][3] or 0
-            return (proteins, fats, carbs, kcal)
+            totals = (proteins, fats, carbs, kcal)
         else:
-            return (0, 0, 0, 0)
+            totals = (0, 0, 0, 0)
+
+        totals_cache.put(key, totals, generation)
+        return totals
 
     def get_norm(self):
         """Get daily norm values"""
-        norm_protein = self.norm_bjv['protein']
-        norm_fat = self.norm_bjv['fat']
-        norm_carbs = self.norm_bjv['carb']
-        norm_calories = self.norm_calories
+        _, norm_calories, (norm_protein, norm_fat, norm_carbs) = self.get_norm_values()
         return norm_protein, norm_fat, norm_carbs, norm_calories
 
-    def get_consumed_nutrition(self, target_date=date.today()):
+    def get_consumed_nutrition(self, target_date=None):
         """Get consumed values for today (or specified date)"""
         consumed_protein, consumed_fat, consumed_carbs, consumed_calories = self.get_daily_totals(db_name=self.db_name, target_date=target_date)
         return consumed_protein, consumed_fat, consumed_carbs, consumed_calories
@@ -256,32 +246,132 @@ class CalorieCounting:
 
         return advice_pool[:4]
 
-    def get_summary_table_data(self, period="week"):
-        """Create summary table data for the selected time period"""
+    def iter_daily_totals(self, start_date, end_date):
+        """Yield (date, (proteins, fats, carbs, kcal)) for every day of the range, newest first.
+        All days are read with one GROUP BY query, days without data are filled with zeros"""
+        rows = DBControl.iter_query(self.db_name, DAILY_TOTALS_RANGE_SQL,
+                                    (self.user.email, start_date.isoformat(), end_date.isoformat()))
+
+        row = next(rows, None)
+        current_date = end_date
+        while current_date >= start_date:
+            date_str = current_date.isoformat()
+            if row is not None and row[0] == date_str:
+                yield current_date, tuple(value or 0 for value in row[1:])
+                row = next(rows, None)
+            else:
+                yield current_date, (0, 0, 0, 0)
+            current_date -= timedelta(days=1)
+
+    def get_daily_totals_range(self, start_date, end_date):
+        """Get {date: (proteins, fats, carbs, kcal)} for every day of the range with one query"""
+        return dict(self.iter_daily_totals(start_date, end_date))
+
+    @staticmethod
+    def get_period_start(period_type, day):
+        """Get the first day of the week (Monday) or month of the day, the same as PERIOD_START of the rollups"""
+        if period_type == "week":
+            return day - timedelta(days=day.weekday())
+        if period_type == "month":
+            return day.replace(day=1)
+        raise ValueError("Period type must be 'week' or 'month'")
+
+    def iter_rollup_totals(self, period_type, start_date, end_date):
+        """Yield (period_start, days, (proteins, fats, carbs, kcal)) for every week or month of the range,
+        newest first. Rows are read from WEEKLY_TOTALS/MONTHLY_TOTALS, periods without data are filled with zeros"""
+        first_period = self.get_period_start(period_type, start_date)
+        rows = DBControl.iter_query(self.db_name, ROLLUP_TOTALS_RANGE_SQL[period_type],
+                                    (self.user.email, first_period.isoformat(), end_date.isoformat()))
+
+        row = next(rows, None)
+        current_period = self.get_period_start(period_type, end_date)
+        while current_period >= first_period:
+            if row is not None and row[0] == current_period.isoformat():
+                yield current_period, row[1], tuple(value or 0 for value in row[2:])
+                row = next(rows, None)
+            else:
+                yield current_period, 0, (0, 0, 0, 0)
+
+            if period_type == "week":
+                current_period -= timedelta(days=7)
+            else:
+                current_period = (current_period - timedelta(days=1)).replace(day=1)
+
+    def get_rollup_totals(self, period_type, start_date, end_date):
+        """Get {period_start: (days, (proteins, fats, carbs, kcal))} for every week or month of the range"""
+        return {period: (days, totals) for period, days, totals in self.iter_rollup_totals(period_type, start_date, end_date)}
+
+    def get_average_daily_totals(self, period_type, start_date, end_date):
+        """Get {period_start: (proteins, fats, carbs, kcal)} averages per day with consumed calories"""
+        return {
+            period: tuple(round(value / days, 1) for value in totals) if days else (0, 0, 0, 0)
+            for period, days, totals in self.iter_rollup_totals(period_type, start_date, end_date)
+        }
+
+    def get_first_record_date(self):
+        """Get the date of the first CONSUMED record of the user (None if there are no records)"""
+        result = DBControl.query_data(self.db_name, FIRST_RECORD_DATE_SQL, (self.user.email,))
+        if result and result[0][0]:
+            return date.fromisoformat(result[0][0])
+        return None
+
+    def get_period_range(self, period="week", start_date=None, end_date=None):
+        """Get (start_date, end_date) of the period: week, month, halfyear, year, alltime or custom"""
         today = date.today()
 
         if period == "week":
             start_date = today - timedelta(days=6)
         elif period == "month":
             start_date = today.replace(day=1)
-        elif period == "halfyear":
-            month = today.month - 6
+        elif period in ("halfyear", "year"):
+            month = today.month - (6 if period == "halfyear" else 12)
             year = today.year
             if month <= 0:
                 month += 12
                 year -= 1
             start_date = date(year, month, 1)
+        elif period == "alltime":
+            start_date = self.get_first_record_date() or today
+        elif period == "custom":
+            if start_date is None or end_date is None:
+                raise ValueError("Custom period needs start_date and end_date")
+            if start_date > end_date:
+                raise ValueError("start_date must not be after end_date")
+            return start_date, end_date
         else:
-            raise ValueError("Period must be 'week', 'month' or 'halfyear'")
-
-        table_rows = []
-        _, _, _, norm_calories = self.get_norm()
-        days_range = (today - start_date).days + 1
+            raise ValueError("Period must be 'week', 'month', 'halfyear', 'year', 'alltime' or 'custom'")
+
+        return start_date, today
+
+    def iter_summary_rows(self, period="week", start_date=None, end_date=None):
+        """Yield summary rows (date, calories consumed, calorie norm, final result, proteins, fats, carbs)
+        of the period, rows are streamed from the database. Long periods are per week or month
+        from the rollups with average values of the days with data. Every row has the norm of its own date"""
+        start_date, end_date = self.get_period_range(period, start_date, end_date)
+
+        rollup_period = SUMMARY_ROLLUPS.get(period)
+        if rollup_period:
+            period_end = end_date
+            for period_start, days, totals in self.iter_rollup_totals(rollup_period, start_date, end_date):
+                label = period_start.isoformat() if rollup_period == "week" else period_start.strftime("%Y-%m")
+                # a week or month is compared with the norm in effect on its last day
+                _, _, _, norm_calories = self.get_norm_on(period_end)
+                period_end = period_start - timedelta(days=1)
+
+                if days == 0:
+                    proteins, fats, carbs, average_calories = 0, 0, 0, 0
+                    diff_str = "No data"
+                else:
+                    proteins, fats, carbs, average_calories = (round(value / days, 1) for value in totals)
+                    difference = round(average_calories - norm_calories, 1)
+                    diff_str = f"{'+' if difference >= 0 else ''}{difference}"
+
+                yield label, average_calories, norm_calories, diff_str, proteins, fats, carbs
+            return
 
-        for i in reversed(range(days_range)):
-            current_date = start_date + timedelta(days=i)
+        for current_date, (proteins, fats, carbs, consumed_calories) in self.iter_daily_totals(start_date, end_date):
             date_str = current_date.isoformat()
-            _, _, _, consumed_calories = self.get_consumed_nutrition(current_date)
+            _, _, _, norm_calories = self.get_norm_on(current_date)
 
             if consumed_calories == 0:
                 diff_str = "No data"
@@ -289,28 +379,55 @@ class CalorieCounting:
                 difference = consumed_calories - norm_calories
                 diff_str = f"{'+' if difference >= 0 else ''}{difference}"
 
-            table_rows.append((date_str, consumed_calories, norm_calories, diff_str))
+            yield date_str, consumed_calories, norm_calories, diff_str, proteins, fats, carbs
+
+    def get_summary_table_data(self, period="week", start_date=None, end_date=None):
+        """Create summary table data for the selected time period"""
+        return [row[:4] for row in self.iter_summary_rows(period, start_date, end_date)]
+
+    def get_consumed_nutrition_async(self, target_date=None):
+        """Run get_consumed_nutrition in the background DB worker, returns Future"""
+        return get_worker().submit(self.get_consumed_nutrition, target_date)
+
+    def get_nutrition_percentage_async(self):
+        """Run get_nutrition_percentage in the background DB worker, returns Future"""
+        return get_worker().submit(self.get_nutrition_percentage)
+
+    def get_nutrition_advice_async(self):
+        """Run get_nutrition_advice in the background DB worker, returns Future"""
+        return get_worker().submit(self.get_nutrition_advice)
 
-        return table_rows
+    def get_summary_table_data_async(self, period="week", start_date=None, end_date=None):
+        """Run get_summary_table_data in the background DB worker, returns Future"""
+        return get_worker().submit(self.get_summary_table_data, period, start_date, end_date)
 
-    def save_table_to_file(self, table=None):
-        """Save summary table data to a file"""
-        table_data = []
-        for row_id in table.get_children():
-            row_values = table.item(row_id)["values"]
-            table_data.append(row_values)
+    def update_norm_if_needed_async(self, db_name):
+        """Run update_norm_if_needed in the background DB worker, returns Future"""
+        return get_worker().submit(self.update_norm_if_needed, db_name)
+
+    def export_summary_async(self, file_path, period="week", start_date=None, end_date=None):
+        """Run export_summary in the background DB worker, returns Future of the number of rows"""
+        return get_worker().submit(export_summary, self, file_path, period, start_date, end_date)
+
+    def save_table_to_file(self, widget, period="week", start_date=None, end_date=None):
+        """Save summary data of the period to a file, rows are exported straight from the database
+        in the background DB worker, the result is reported in the Tk thread of the widget"""
+        # imported here, so the class works without Tk (batch reports)
+        from tkinter import filedialog
 
         file_path = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("Text files", "*.txt"), ("All files", "*.*")]
+            filetypes=[("CSV files", "*.csv"), ("Compressed CSV files", "*.csv.gz"), ("JSON lines", "*.jsonl"),
+                       ("Parquet files", "*.parquet"), ("All files", "*.*")]
         )
 
         if not file_path:
             return
 
-        with open(file_path, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            writer.writerow(["Date", "Calories Consumed", "Calorie Norm", "Final Result"])
-            writer.writerows(table_data)
+        def on_saved(count):
+            print(f"[INFO] {count} rows successfully saved to file: {file_path}")
+
+        def on_failed(error):
+            print(f"[ERROR] Failed to save data: {error}")
 
-        print(f"[INFO] Data successfully saved to file: {file_path}")
\ No newline at end of file
+        deliver(widget, self.export_summary_async(file_path, period, start_date, end_date), on_saved, on_failed)
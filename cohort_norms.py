@@ -0,0 +1,140 @@
+from datetime import date
+
+from DB_control import DBControl
+from calorie_counting import calculate_norms
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Daily norms of many users at once, the same formulas as calorie_counting.calculate_norms
+# (Mifflin-St Jeor BMR, activity factor, goal and 30/30/40 macro split) but on NumPy column arrays.
+# Results are equal to the scalar version up to the last digit, also the rounding of protein/fat/carb.
+#
+# norms from column arrays (lists or numpy arrays)
+#       norms = calculate_norms_batch(weights, heights, ages, sexes, goals, activity_factors)
+#       norms["kcal"], norms["protein"], norms["fat"], norms["carb"], norms["bmr"]
+#
+# norms of all users of the database
+#       emails, norms = calculate_cohort_norms("Health_database.db")
+#
+# numpy is needed only for this module:
+#       pip install numpy
+#
+#       python cohort_norms.py Health_database.db      (print norms of all users)
+
+USER_COLUMNS = ["EMAIL", "BIRTH_DATE", "WEIGHT", "HEIGHT", "SEX", "GOAL", "ACTIVITY_FACTOR"]
+
+PROTEIN_RATIO = 0.30
+FAT_RATIO = 0.30
+CARB_RATIO = 0.40
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("cohort_norms needs numpy, install it with: pip install numpy")
+
+
+def round_like_python(values, digits=1):
+    # np.round(x, 1) works as rint(x * 10) / 10 and x * 10 is not exact, so values close to a half
+    # can be rounded to the other side than Python round(). Only these values are rounded again by Python.
+    rounded = np.round(values, digits)
+    scaled = values * 10 ** digits
+    fraction = np.abs(scaled - np.trunc(scaled))
+    ambiguous = np.flatnonzero(np.abs(fraction - 0.5) < 1e-6)
+    for i in ambiguous:
+        rounded[i] = round(float(values[i]), digits)
+    return rounded
+
+
+def calculate_norms_batch(weights, heights, ages, sexes, goals, activity_factors):
+    # Arrays of bmr, kcal, protein, fat and carb norms, the order of operations is the same as in
+    # calculate_norms, so floating point results are identical
+    _require_numpy()
+    weights = np.asarray(weights, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+    ages = np.asarray(ages, dtype=np.float64)
+    activity_factors = np.asarray(activity_factors, dtype=np.float64)
+    sexes = np.asarray(sexes)
+    goals = np.asarray(goals)
+
+    bmr = 10 * weights + 6.25 * heights - 5 * ages
+    bmr = np.where(sexes == 'M', bmr + 5, bmr - 161)
+
+    total_calories = bmr * activity_factors
+    total_calories = np.where(goals == 'L', total_calories - 500, total_calories)
+    total_calories = np.where(goals == 'G', total_calories + 500, total_calories)
+
+    protein = total_calories * PROTEIN_RATIO / 4
+    fat = total_calories * FAT_RATIO / 9
+    carb = total_calories * CARB_RATIO / 4
+
+    return {
+        "bmr": bmr,
+        "kcal": total_calories,
+        "protein": round_like_python(protein),
+        "fat": round_like_python(fat),
+        "carb": round_like_python(carb)
+    }
+
+
+def ages_from_birth_dates(birth_dates, on_date=None):
+    # Array of full years for "YYYY-MM-DD" birth dates, the same as User.get_age
+    _require_numpy()
+    today = on_date or date.today()
+    births = np.asarray(birth_dates, dtype="datetime64[D]")
+
+    years = births.astype("datetime64[Y]").astype(np.int64) + 1970
+    months = births.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    days = (births - births.astype("datetime64[M]")).astype(np.int64) + 1
+
+    birthday_not_reached = (months > today.month) | ((months == today.month) & (days > today.day))
+    return today.year - years - birthday_not_reached
+
+
+def load_user_columns(db_name, batch_size=10000):
+    # Columns of USERS table as lists, rows are streamed from the database
+    columns = {name: [] for name in USER_COLUMNS}
+    for row in DBControl.iter_data(db_name, "USERS", USER_COLUMNS, batch_size=batch_size):
+        for name, value in zip(USER_COLUMNS, row):
+            columns[name].append(value)
+    return columns
+
+
+def calculate_cohort_norms(db_name, on_date=None):
+    # Emails of all users and their norms arrays
+    columns = load_user_columns(db_name)
+    if not columns["EMAIL"]:
+        return [], None
+
+    ages = ages_from_birth_dates(columns["BIRTH_DATE"], on_date)
+    norms = calculate_norms_batch(
+        columns["WEIGHT"], columns["HEIGHT"], ages,
+        columns["SEX"], columns["GOAL"], columns["ACTIVITY_FACTOR"]
+    )
+    return columns["EMAIL"], norms
+
+
+def check_against_scalar(weights, heights, ages, sexes, goals, activity_factors, norms):
+    # Indexes of users whose batch norms differ from calculate_norms
+    different = []
+    for i in range(len(weights)):
+        bmr, total_calories, (protein, fat, carb) = calculate_norms.__wrapped__(
+            weights[i], heights[i], int(ages[i]), sexes[i], goals[i], activity_factors[i]
+        )
+        if (bmr != norms["bmr"][i] or total_calories != norms["kcal"][i] or protein != norms["protein"][i]
+                or fat != norms["fat"][i] or carb != norms["carb"][i]):
+            different.append(i)
+    return different
+
+
+if __name__ == "__main__":
+    import sys
+
+    db_name = sys.argv[1] if len(sys.argv) > 1 else "Health_database.db"
+    emails, norms = calculate_cohort_norms(db_name)
+
+    print(f"{'user':<30}{'kcal':>10}{'protein':>10}{'fat':>10}{'carb':>10}")
+    for i, email in enumerate(emails):
+        print(f"{email:<30}{norms['kcal'][i]:>10.1f}{norms['protein'][i]:>10.1f}{norms['fat'][i]:>10.1f}{norms['carb'][i]:>10.1f}")
@@ -0,0 +1,90 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+# Database calls of the windows are done in one background thread, so the Tk mainloop never waits for SQLite
+#
+# run a function in the worker, the result is a concurrent.futures.Future
+#       future = get_worker().submit(nutrition.show_today_consumption)
+#
+# get the result in the Tk thread (widgets can be changed only there), the future is checked with after()
+#       deliver(window, future, lambda rows: fill_table(rows))
+#
+# the worker thread has its own pooled DBControl connection, so it never shares one with the Tk thread
+
+
+class DBWorker:
+    def __init__(self, name="db-worker"):
+        self._tasks = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, function, *args, **kwargs):
+        # Put function call to the queue, returns Future of its result
+        future = Future()
+        self._tasks.put((future, function, args, kwargs))
+        return future
+
+    def stop(self, wait=True):
+        # Finish queued tasks and stop the thread
+        self._tasks.put(None)
+        if wait:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+
+            future, function, args, kwargs = task
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = function(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker():
+    # Shared worker of the application, started on first use
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = DBWorker()
+        return _worker
+
+
+def deliver(widget, future, callback, error_callback=None, poll_ms=10):
+    # Call callback(result) in the Tk thread when the future is done,
+    # nothing is called if the widget was destroyed while waiting
+    def check():
+        try:
+            if not widget.winfo_exists():
+                return
+        except Exception:
+            return
+
+        if not future.done():
+            widget.after(poll_ms, check)
+            return
+
+        if future.cancelled():
+            return
+
+        error = future.exception()
+        if error is None:
+            callback(future.result())
+        elif error_callback:
+            error_callback(error)
+        else:
+            print(f"[ERROR] Database task failed: {error}")
+
+    widget.after(0, check)
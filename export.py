@@ -0,0 +1,214 @@
+import csv
+import gzip
+import json
+import sys
+from datetime import date
+
+from DB_control import DBControl
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Export of NUTRITION, CONSUMED and summary rows straight from the database. Rows are read by batches
+# and written one by one (columnar formats by batches), so memory use does not depend on the period.
+# The format is taken from the file extension:
+#       .csv  .csv.gz  .jsonl  .jsonl.gz  .parquet  .arrow (Arrow IPC file, also .feather)
+# parquet and arrow need pyarrow (pip install pyarrow)
+#
+# products eaten by the user in 2024
+#       export_table("Health_database.db", "nutrition", "nutrition_2024.csv.gz", "TestUser", date(2024, 1, 1), date(2024, 12, 31))
+#
+# day totals of all users
+#       export_table("Health_database.db", "consumed", "consumed.parquet")
+#
+# statistics window rows with macro totals
+#       export_summary(calorie_counter, "summary.jsonl", period="year")
+#
+# any rows, for example from another generator
+#       export_rows("rows.csv", [("NAME", "text"), ("VALUE", "real")], rows)
+#
+#       python export.py Health_database.db nutrition nutrition.csv.gz [USER] [START] [END]
+
+FORMATS = ["csv", "csv.gz", "jsonl", "jsonl.gz", "parquet", "arrow"]
+
+# source: (table, [(column, type)], date column), type is "text" or "real"
+EXPORT_TABLES = {
+    "nutrition": ("NUTRITION", [
+        ("USER", "text"), ("DATE", "text"), ("PRODUCT", "text"), ("CONSUMED_MASS", "real"),
+        ("CONSUMED_PROTEINS", "real"), ("CONSUMED_FATS", "real"), ("CONSUMED_CARBOHYDRATES", "real"),
+        ("CONSUMED_KCAL", "real")
+    ], "DATE"),
+    "consumed": ("CONSUMED", [
+        ("USER", "text"), ("DATE", "text"), ("TOTAL_MASS", "real"), ("TOTAL_PROTEINS", "real"),
+        ("TOTAL_FATS", "real"), ("TOTAL_CARBOHYDRATES", "real"), ("TOTAL_KCAL", "real"),
+        ("NORM_PROTEINS", "real"), ("NORM_FATS", "real"), ("NORM_CARBOHYDRATES", "real"), ("NORM_KCAL", "real")
+    ], "DATE"),
+}
+
+SUMMARY_COLUMNS = [
+    ("DATE", "text"), ("CALORIES_CONSUMED", "real"), ("CALORIE_NORM", "real"), ("FINAL_RESULT", "text"),
+    ("PROTEINS", "real"), ("FATS", "real"), ("CARBOHYDRATES", "real")
+]
+
+
+def detect_format(path):
+    # Export format of the file name, csv if the extension is unknown
+    name = path.lower()
+    if name.endswith(".feather"):
+        return "arrow"
+    for export_format in sorted(FORMATS, key=len, reverse=True):
+        if name.endswith(f".{export_format}"):
+            return export_format
+    return "csv"
+
+
+class TextRowWriter:
+    # CSV or JSON lines, gzip compressed if the format ends with .gz
+    def __init__(self, path, columns, export_format):
+        self.names = [name for name, _ in columns]
+        self.is_csv = export_format.startswith("csv")
+        if export_format.endswith(".gz"):
+            self.file = gzip.open(path, "wt", newline="", encoding="utf-8")
+        else:
+            self.file = open(path, "w", newline="", encoding="utf-8")
+
+        if self.is_csv:
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.names)
+
+    def write_row(self, row):
+        if self.is_csv:
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(dict(zip(self.names, row)), ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ArrowRowWriter:
+    # Parquet or Arrow IPC file, rows are collected to columns and written by record batches
+    def __init__(self, path, columns, export_format, batch_size=10000):
+        if pa is None:
+            raise ImportError(f"{export_format} export needs pyarrow, install it with: pip install pyarrow")
+
+        self.types = [kind for _, kind in columns]
+        self.schema = pa.schema([(name, pa.string() if kind == "text" else pa.float64()) for name, kind in columns])
+        self.batch_size = batch_size
+        self.columns = [[] for _ in columns]
+
+        self.sink = pa.OSFile(path, "wb")
+        try:
+            if export_format == "parquet":
+                self.writer = pq.ParquetWriter(self.sink, self.schema, compression="zstd")
+            else:
+                self.writer = pa.ipc.new_file(self.sink, self.schema)
+        except BaseException:
+            # the file is not closed by anyone else if the writer was not made
+            self.sink.close()
+            raise
+
+    def write_row(self, row):
+        for values, kind, value in zip(self.columns, self.types, row):
+            if value is not None:
+                value = str(value) if kind == "text" else float(value)
+            values.append(value)
+
+        if len(self.columns[0]) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self.columns[0]:
+            batch = pa.record_batch([pa.array(values, type=field.type) for values, field in zip(self.columns, self.schema)],
+                                    schema=self.schema)
+            if isinstance(self.writer, pq.ParquetWriter):
+                self.writer.write_batch(batch)
+            else:
+                self.writer.write(batch)
+            self.columns = [[] for _ in self.columns]
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+        self.sink.close()
+
+
+def open_writer(path, columns, export_format=None):
+    # Writer with write_row(row) and close() for the format (taken from the path if not given)
+    export_format = export_format or detect_format(path)
+    if export_format not in FORMATS:
+        raise ValueError(f"Export format must be one of: {', '.join(FORMATS)}")
+    if export_format in ("parquet", "arrow"):
+        return ArrowRowWriter(path, columns, export_format)
+    return TextRowWriter(path, columns, export_format)
+
+
+def export_rows(path, columns, rows, export_format=None):
+    # Write rows of any iterable to the file, returns number of rows
+    writer = open_writer(path, columns, export_format)
+    count = 0
+    try:
+        for row in rows:
+            writer.write_row(row)
+            count += 1
+    finally:
+        writer.close()
+    return count
+
+
+def iter_table_rows(db_name, source, user=None, start_date=None, end_date=None, batch_size=1000):
+    # Rows of NUTRITION or CONSUMED of the user (all users if None) and date range, one user is in date order
+    table_name, columns, date_column = EXPORT_TABLES[source]
+    conditions = []
+    params = []
+    if user is not None:
+        conditions.append("USER = ?")
+        params.append(user)
+    if start_date is not None:
+        conditions.append(f"{date_column} >= ?")
+        params.append(str(start_date))
+    if end_date is not None:
+        conditions.append(f"{date_column} <= ?")
+        params.append(str(end_date))
+
+    # rows of one user come in date order from the USER, DATE index, other exports are in table order
+    # (insertion order), so sqlite never has to sort the whole table in memory
+    condition = " AND ".join(conditions)
+    if user is not None:
+        condition += f" ORDER BY {date_column}"
+    yield from DBControl.iter_data(db_name, table_name, [name for name, _ in columns], condition, tuple(params),
+                                   batch_size=batch_size)
+
+
+def export_table(db_name, source, path, user=None, start_date=None, end_date=None, export_format=None):
+    # Export "nutrition" or "consumed" rows, returns number of rows
+    columns = EXPORT_TABLES[source][1]
+    return export_rows(path, columns, iter_table_rows(db_name, source, user, start_date, end_date), export_format)
+
+
+def export_summary(calorie_counter, path, period="week", start_date=None, end_date=None, export_format=None):
+    # Export summary rows of the statistics window (with macro totals), returns number of rows
+    rows = calorie_counter.iter_summary_rows(period, start_date, end_date)
+    return export_rows(path, SUMMARY_COLUMNS, rows, export_format)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[2] not in EXPORT_TABLES:
+        print(f"Usage: python export.py DB {{{'|'.join(EXPORT_TABLES)}}} FILE [USER] [START] [END]")
+        sys.exit(1)
+
+    db_name, source, path = sys.argv[1:4]
+    user = sys.argv[4] if len(sys.argv) > 4 else None
+    start_date = date.fromisoformat(sys.argv[5]) if len(sys.argv) > 5 else None
+    end_date = date.fromisoformat(sys.argv[6]) if len(sys.argv) > 6 else None
+
+    try:
+        count = export_table(db_name, source, path, user, start_date, end_date)
+    except (ImportError, ValueError) as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+    print(f"[INFO] {count} rows exported to {path}")
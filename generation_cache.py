@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+
+# Thread-safe LRU cache of values read from the database, the base of totals_cache and product_cache.
+# A generation counter is changed by every write or invalidation, so a value that was read before a change
+# (and could be stale) is not stored:
+#
+#       generation = cache.generation
+#       value = read_from_database()
+#       cache.put(key, value, generation)               # ignored if the cache was changed since the read
+#
+#       cache.get(key)                                  # None if the key is not cached
+#       cache.update(key, lambda value: ...)            # change a cached value in place after a commit
+#       cache.invalidate(key), cache.invalidate_where(lambda key: ...), cache.clear()
+#
+#       cache.hits, cache.misses, cache.stats()
+#
+# the least recently used values are evicted when there are more than max_size of them, values are stored as tuples
+
+
+class GenerationCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        # Cached value or None
+        with self._lock:
+            value = self._values.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._values.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation=None):
+        # Store value read from the database, generation is the value of self.generation before the read
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._values[key] = tuple(value)
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+
+    def update(self, key, change):
+        # Replace the cached value with change(value), keys that are not cached are left to the next read
+        with self._lock:
+            self._generation += 1
+            value = self._values.get(key)
+            if value is not None:
+                self._values[key] = tuple(change(value))
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._values.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        # Forget the keys for which predicate(key) is true
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._values if predicate(key)]:
+                del self._values[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._values.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._values)}
+
+    def __len__(self):
+        return len(self._values)
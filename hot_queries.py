@@ -0,0 +1,37 @@
+# SQL of the statements that run on every screen update or product change. Nutrition, CalorieCounting and
+# NormHistory run exactly these strings and "python migrations.py DB --check" explains the same ones,
+# so a changed statement can not lose its index without the check seeing it.
+#
+#       from hot_queries import DAILY_TOTALS_SQL
+#       DBControl.query_data(db_name, DAILY_TOTALS_SQL, (user_email, "2025-06-01"))
+#
+# rows are keyed by the user email (see calorie_counting.py)
+
+TODAY_NUTRITION_SQL = "SELECT * FROM NUTRITION WHERE USER = ? AND DATE = ?;"
+
+# one row of the product (the first one if it was eaten several times with the same mass), its values
+# are returned so the day totals in the cache can be updated
+REMOVE_CONSUMED_PRODUCT_SQL = """DELETE FROM NUTRITION
+                                 WHERE ROWID = (SELECT ROWID FROM NUTRITION
+                                                WHERE USER = ? AND DATE = ? AND PRODUCT = ? AND CONSUMED_MASS = ? LIMIT 1)
+                                 RETURNING CONSUMED_PROTEINS, CONSUMED_FATS, CONSUMED_CARBOHYDRATES, CONSUMED_KCAL;"""
+
+DAILY_TOTALS_SQL = """SELECT SUM(TOTAL_PROTEINS), SUM(TOTAL_FATS), SUM(TOTAL_CARBOHYDRATES), SUM(TOTAL_KCAL)
+                      FROM CONSUMED WHERE USER = ? AND DATE = ?;"""
+
+DAILY_TOTALS_RANGE_SQL = """SELECT DATE, SUM(TOTAL_PROTEINS), SUM(TOTAL_FATS), SUM(TOTAL_CARBOHYDRATES), SUM(TOTAL_KCAL)
+                            FROM CONSUMED WHERE USER = ? AND DATE BETWEEN ? AND ?
+                            GROUP BY DATE ORDER BY DATE DESC;"""
+
+FIRST_RECORD_DATE_SQL = "SELECT MIN(DATE) FROM CONSUMED WHERE USER = ?;"
+
+# by period type of migrations.ROLLUP_TABLES
+ROLLUP_TOTALS_RANGE_SQL = {
+    period_type: f"""SELECT PERIOD_START, DAYS, TOTAL_PROTEINS, TOTAL_FATS, TOTAL_CARBOHYDRATES, TOTAL_KCAL
+                     FROM {table} WHERE USER = ? AND PERIOD_START BETWEEN ? AND ?
+                     ORDER BY PERIOD_START DESC;"""
+    for period_type, table in (("week", "WEEKLY_TOTALS"), ("month", "MONTHLY_TOTALS"))
+}
+
+NORM_HISTORY_SQL = """SELECT EFFECTIVE_FROM, NORM_PROTEINS, NORM_FATS, NORM_CARBOHYDRATES, NORM_KCAL
+                      FROM NORM_HISTORY WHERE USER = ? ORDER BY EFFECTIVE_FROM;"""
@@ -0,0 +1,522 @@
+import os
+import sqlite3
+import sys
+
+from DB_control import DBControl
+from totals_cache import totals_cache
+from hot_queries import (TODAY_NUTRITION_SQL, REMOVE_CONSUMED_PRODUCT_SQL, DAILY_TOTALS_SQL, DAILY_TOTALS_RANGE_SQL,
+                         FIRST_RECORD_DATE_SQL, ROLLUP_TOTALS_RANGE_SQL, NORM_HISTORY_SQL)
+
+# Schema of the database is built by ordered migrations, the number of the last applied one
+# is stored in PRAGMA user_version of the database file
+#
+# apply all missing migrations (it is done at startup by the app, Nutrition and CalorieCounting)
+#       apply_migrations("Health_database.db")
+#
+# check that the hot queries use indexes (prints EXPLAIN QUERY PLAN of each of them)
+#       python migrations.py Health_database.db --check
+#
+# CONSUMED totals are maintained by triggers on NUTRITION, compare them with totals rebuilt
+# from NUTRITION (and write the rebuilt ones with --repair)
+#       python migrations.py Health_database.db --verify-totals [--repair]
+#
+# WEEKLY_TOTALS and MONTHLY_TOTALS (per user week/month sums of CONSUMED) are maintained by triggers
+# on CONSUMED, regenerate them from CONSUMED if they were changed by hand
+#       python migrations.py Health_database.db --rebuild-rollups
+#
+# PRODUCTS_FTS is a full-text index of product names for Nutrition.search_products, kept in sync by
+# triggers on PRODUCTS (it is not created if sqlite is built without FTS5, search then works in memory)
+#
+# PICTURE_THUMBNAILS keeps pictures resized for the nutrition window, they are made by thumbnails.py
+# on the first request or in bulk, triggers on PICTURES delete the thumbnail of a changed picture
+#
+# to change the schema, add a new migration to the end of MIGRATIONS and never edit applied ones,
+# a migration is a list of SQL statements or a function that gets the connection
+
+BASE_TABLES_SQL = [
+    """CREATE TABLE IF NOT EXISTS PRODUCTS (
+       PRODUCT TEXT PRIMARY KEY,
+       PROTEINS REAL NOT NULL,
+       FATS REAL NOT NULL,
+       CARBOHYDRATES REAL NOT NULL,
+       KCAL INTEGER NOT NULL
+       );""",
+    """CREATE TABLE IF NOT EXISTS PICTURES (
+       PRODUCT TEXT PRIMARY KEY,
+       IMAGE BLOB NOT NULL
+       );""",
+    """CREATE TABLE IF NOT EXISTS NUTRITION (
+       USER TEXT NOT NULL,
+       DATE DATE NOT NULL,
+       PRODUCT TEXT NOT NULL,
+       CONSUMED_MASS REAL NOT NULL,
+       CONSUMED_PROTEINS REAL NOT NULL,
+       CONSUMED_FATS REAL NOT NULL,
+       CONSUMED_CARBOHYDRATES REAL NOT NULL,
+       CONSUMED_KCAL INTEGER NOT NULL
+       );""",
+    """CREATE TABLE IF NOT EXISTS CONSUMED (
+       USER TEXT NOT NULL,
+       DATE DATE NOT NULL,
+       TOTAL_MASS REAL NOT NULL,
+       TOTAL_PROTEINS REAL NOT NULL,
+       TOTAL_FATS REAL NOT NULL,
+       TOTAL_CARBOHYDRATES REAL NOT NULL,
+       TOTAL_KCAL INTEGER NOT NULL,
+       NORM_PROTEINS REAL NOT NULL,
+       NORM_FATS REAL NOT NULL,
+       NORM_CARBOHYDRATES REAL NOT NULL,
+       NORM_KCAL INTEGER NOT NULL
+       );""",
+    """CREATE TABLE IF NOT EXISTS USERS (
+       EMAIL TEXT PRIMARY KEY,
+       PASSWORD TEXT NOT NULL,
+       NAME TEXT NOT NULL,
+       BIRTH_DATE DATE NOT NULL,
+       WEIGHT INTEGER NOT NULL,
+       HEIGHT INT NOT NULL,
+       SEX TEXT NOT NULL,
+       GOAL TEXT NOT NULL,
+       BJV_MODE TEXT NOT NULL,
+       ACTIVITY_FACTOR REAL NOT NULL
+       );""",
+    """CREATE TABLE IF NOT EXISTS activities (
+       id INTEGER PRIMARY KEY AUTOINCREMENT,
+       user_id INTEGER NOT NULL,
+       activity_type TEXT NOT NULL,
+       duration_minutes INTEGER NOT NULL,
+       calories_burned REAL NOT NULL,
+       date TEXT NOT NULL,
+       FOREIGN KEY (user_id) REFERENCES users (id)
+       );""",
+]
+
+
+def fix_nutrition_primary_key(conn):
+    # Old versions of Nutrition created NUTRITION with USER TEXT PRIMARY KEY,
+    # that allows only one product per user, so the table is rebuilt without it
+    columns = conn.execute("PRAGMA table_info(NUTRITION);").fetchall()
+    if not any(name == "USER" and pk for _, name, _, _, _, pk in columns):
+        return
+
+    conn.execute("ALTER TABLE NUTRITION RENAME TO NUTRITION_OLD;")
+    conn.execute(BASE_TABLES_SQL[2])
+    conn.execute("INSERT INTO NUTRITION SELECT * FROM NUTRITION_OLD;")
+    conn.execute("DROP TABLE NUTRITION_OLD;")
+
+
+HOT_KEY_INDEXES_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_nutrition_user_date ON NUTRITION (USER, DATE);",
+    # CONSUMED must have one row per user and day, duplicates are merged before the unique index,
+    # totals are summed (that is how they were read) and the real norm is kept instead of -1
+    """CREATE TEMP TABLE consumed_duplicates AS
+       SELECT USER, DATE,
+              SUM(TOTAL_MASS) AS TOTAL_MASS, SUM(TOTAL_PROTEINS) AS TOTAL_PROTEINS,
+              SUM(TOTAL_FATS) AS TOTAL_FATS, SUM(TOTAL_CARBOHYDRATES) AS TOTAL_CARBOHYDRATES,
+              SUM(TOTAL_KCAL) AS TOTAL_KCAL,
+              MAX(NORM_PROTEINS) AS NORM_PROTEINS, MAX(NORM_FATS) AS NORM_FATS,
+              MAX(NORM_CARBOHYDRATES) AS NORM_CARBOHYDRATES, MAX(NORM_KCAL) AS NORM_KCAL
+       FROM CONSUMED GROUP BY USER, DATE HAVING COUNT(*) > 1;""",
+    "DELETE FROM CONSUMED WHERE (USER, DATE) IN (SELECT USER, DATE FROM consumed_duplicates);",
+    "INSERT INTO CONSUMED SELECT * FROM consumed_duplicates;",
+    "DROP TABLE consumed_duplicates;",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_consumed_user_date ON CONSUMED (USER, DATE);",
+    "CREATE INDEX IF NOT EXISTS idx_activities_date ON activities (date);",
+    "CREATE INDEX IF NOT EXISTS idx_activities_user_date ON activities (user_id, date);",
+]
+
+TOTAL_COLUMNS = [
+    ("TOTAL_MASS", "CONSUMED_MASS"),
+    ("TOTAL_PROTEINS", "CONSUMED_PROTEINS"),
+    ("TOTAL_FATS", "CONSUMED_FATS"),
+    ("TOTAL_CARBOHYDRATES", "CONSUMED_CARBOHYDRATES"),
+    ("TOTAL_KCAL", "CONSUMED_KCAL"),
+]
+
+
+def _add_to_totals_sql(row):
+    # Statement that adds NUTRITION row (NEW or OLD) to the totals of its day, creates the day if needed
+    return f"""INSERT INTO CONSUMED (USER, DATE, {', '.join(total for total, _ in TOTAL_COLUMNS)},
+                                NORM_PROTEINS, NORM_FATS, NORM_CARBOHYDRATES, NORM_KCAL)
+               VALUES ({row}.USER, {row}.DATE, {', '.join(f'{row}.{value}' for _, value in TOTAL_COLUMNS)}, -1, -1, -1, -1)
+               ON CONFLICT(USER, DATE) DO UPDATE SET {', '.join(f'{total} = {total} + excluded.{total}' for total, _ in TOTAL_COLUMNS)};"""
+
+
+def _subtract_from_totals_sql(row):
+    # Statement that subtracts NUTRITION row (NEW or OLD) from the totals of its day
+    return f"""UPDATE CONSUMED SET {', '.join(f'{total} = {total} - {row}.{value}' for total, value in TOTAL_COLUMNS)}
+               WHERE USER = {row}.USER AND DATE = {row}.DATE;"""
+
+
+# CONSUMED.TOTAL_* are kept equal to the sums of NUTRITION rows of the day by these triggers
+CONSUMED_TRIGGERS_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_nutrition_insert AFTER INSERT ON NUTRITION
+        BEGIN
+            {_add_to_totals_sql("NEW")}
+        END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_nutrition_delete AFTER DELETE ON NUTRITION
+        BEGIN
+            {_subtract_from_totals_sql("OLD")}
+        END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_nutrition_update AFTER UPDATE ON NUTRITION
+        BEGIN
+            {_subtract_from_totals_sql("OLD")}
+            {_add_to_totals_sql("NEW")}
+        END;""",
+]
+
+# period type: (rollup table, SQL expression of the first day of the period of a date)
+# weeks start on Monday: 'weekday 0' moves the date to the next Sunday (or keeps it), then 6 days back
+ROLLUP_TABLES = {
+    "week": ("WEEKLY_TOTALS", "date({date}, 'weekday 0', '-6 days')"),
+    "month": ("MONTHLY_TOTALS", "date({date}, 'start of month')"),
+}
+
+
+def _rollup_table_sql(table):
+    # DAYS is the number of days with consumed calories, it is used for the per day averages
+    return f"""CREATE TABLE IF NOT EXISTS {table} (
+               USER TEXT NOT NULL,
+               PERIOD_START DATE NOT NULL,
+               DAYS INTEGER NOT NULL,
+               {', '.join(f'{total} REAL NOT NULL' for total, _ in TOTAL_COLUMNS)},
+               PRIMARY KEY (USER, PERIOD_START)
+               );"""
+
+
+def _add_to_rollup_sql(table, period_start, row):
+    # Statement that adds CONSUMED row (NEW or OLD) to the totals of its week/month
+    return f"""INSERT INTO {table} (USER, PERIOD_START, DAYS, {', '.join(total for total, _ in TOTAL_COLUMNS)})
+               VALUES ({row}.USER, {period_start.format(date=f'{row}.DATE')}, {row}.TOTAL_KCAL <> 0,
+                       {', '.join(f'{row}.{total}' for total, _ in TOTAL_COLUMNS)})
+               ON CONFLICT(USER, PERIOD_START) DO UPDATE SET DAYS = DAYS + excluded.DAYS,
+                   {', '.join(f'{total} = {total} + excluded.{total}' for total, _ in TOTAL_COLUMNS)};"""
+
+
+def _subtract_from_rollup_sql(table, period_start, row):
+    # Statement that subtracts CONSUMED row (NEW or OLD) from the totals of its week/month
+    return f"""UPDATE {table} SET DAYS = DAYS - ({row}.TOTAL_KCAL <> 0),
+                   {', '.join(f'{total} = {total} - {row}.{total}' for total, _ in TOTAL_COLUMNS)}
+               WHERE USER = {row}.USER AND PERIOD_START = {period_start.format(date=f'{row}.DATE')};"""
+
+
+def _rollup_triggers_sql(table, period_start):
+    name = table.lower()
+    totals = ", ".join(total for total, _ in TOTAL_COLUMNS)
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{name}_insert AFTER INSERT ON CONSUMED
+            BEGIN
+                {_add_to_rollup_sql(table, period_start, "NEW")}
+            END;""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{name}_delete AFTER DELETE ON CONSUMED
+            BEGIN
+                {_subtract_from_rollup_sql(table, period_start, "OLD")}
+            END;""",
+        # norm updates do not change the rollups, so the trigger is only for user, date and totals
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{name}_update AFTER UPDATE OF USER, DATE, {totals} ON CONSUMED
+            BEGIN
+                {_subtract_from_rollup_sql(table, period_start, "OLD")}
+                {_add_to_rollup_sql(table, period_start, "NEW")}
+            END;""",
+    ]
+
+
+def _rebuild_rollup_sql(table, period_start):
+    # Statements that regenerate the rollup table from CONSUMED
+    return [
+        f"DELETE FROM {table};",
+        f"""INSERT INTO {table} (USER, PERIOD_START, DAYS, {', '.join(total for total, _ in TOTAL_COLUMNS)})
+            SELECT USER, {period_start.format(date='DATE')}, SUM(TOTAL_KCAL <> 0),
+                   {', '.join(f'SUM({total})' for total, _ in TOTAL_COLUMNS)}
+            FROM CONSUMED GROUP BY 1, 2;""",
+    ]
+
+
+# tables, their triggers and the first fill from the existing CONSUMED rows
+ROLLUPS_SQL = [
+    sql
+    for table, period_start in ROLLUP_TABLES.values()
+    for sql in [_rollup_table_sql(table), *_rollup_triggers_sql(table, period_start), *_rebuild_rollup_sql(table, period_start)]
+]
+
+def create_norm_history(conn):
+    # Norms are stored as a change log (one row per user and date from which the norm is in effect),
+    # the log is filled from the days of CONSUMED where the norm differs from the previous day of the user
+    conn.execute("""CREATE TABLE IF NOT EXISTS NORM_HISTORY (
+                    USER TEXT NOT NULL,
+                    EFFECTIVE_FROM DATE NOT NULL,
+                    NORM_PROTEINS REAL NOT NULL,
+                    NORM_FATS REAL NOT NULL,
+                    NORM_CARBOHYDRATES REAL NOT NULL,
+                    NORM_KCAL INTEGER NOT NULL,
+                    PRIMARY KEY (USER, EFFECTIVE_FROM)
+                    );""")
+
+    rows = conn.execute("""SELECT USER, DATE, NORM_PROTEINS, NORM_FATS, NORM_CARBOHYDRATES, NORM_KCAL
+                           FROM CONSUMED WHERE NORM_KCAL >= 0 ORDER BY USER, DATE;""")
+    changes = []
+    previous_user, previous_norm = None, None
+    for user, day, *norm in rows:
+        if user != previous_user or norm != previous_norm:
+            changes.append((user, day, *norm))
+        previous_user, previous_norm = user, norm
+
+    conn.executemany("INSERT OR REPLACE INTO NORM_HISTORY VALUES (?, ?, ?, ?, ?, ?);", changes)
+
+
+# rolling windows, streaks and ring buffer of analytics.RollingAnalytics as JSON, one row per user
+ANALYTICS_STATE_SQL = [
+    """CREATE TABLE IF NOT EXISTS ANALYTICS_STATE (
+       USER TEXT PRIMARY KEY,
+       LAST_DATE DATE,
+       STATE TEXT NOT NULL
+       );""",
+]
+
+# full-text index of PRODUCTS.PRODUCT, words are case and diacritics insensitive, 1 to 3 letter prefixes
+# are indexed for type-ahead queries
+PRODUCTS_FTS_TABLE_SQL = """CREATE VIRTUAL TABLE IF NOT EXISTS PRODUCTS_FTS USING fts5(
+                            PRODUCT, tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+                            );"""
+
+# the FTS row of a product is found by the name as a phrase (PRODUCTS has no stable rowid to use),
+# names without any word can not be found by a search, so they do not need to be deleted
+_DELETE_PRODUCT_FTS_SQL = """DELETE FROM PRODUCTS_FTS WHERE rowid IN (
+                                 SELECT rowid FROM PRODUCTS_FTS
+                                 WHERE PRODUCTS_FTS MATCH 'PRODUCT : "' || replace(OLD.PRODUCT, '"', '""') || '"'
+                                   AND PRODUCT = OLD.PRODUCT
+                             );"""
+
+PRODUCTS_FTS_TRIGGERS_SQL = [
+    """CREATE TRIGGER IF NOT EXISTS trg_products_fts_insert AFTER INSERT ON PRODUCTS
+       BEGIN
+           INSERT INTO PRODUCTS_FTS (PRODUCT) VALUES (NEW.PRODUCT);
+       END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_products_fts_delete AFTER DELETE ON PRODUCTS
+        BEGIN
+            {_DELETE_PRODUCT_FTS_SQL}
+        END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_products_fts_update AFTER UPDATE OF PRODUCT ON PRODUCTS
+        BEGIN
+            {_DELETE_PRODUCT_FTS_SQL}
+            INSERT INTO PRODUCTS_FTS (PRODUCT) VALUES (NEW.PRODUCT);
+        END;""",
+]
+
+
+def create_products_fts(conn):
+    # FTS5 is an optional part of sqlite, without it the migration only reports that it is skipped
+    try:
+        conn.execute(PRODUCTS_FTS_TABLE_SQL)
+    except sqlite3.OperationalError as e:
+        print(f"[INFO] Full-text search is not available ({e}), products are searched in memory")
+        return
+
+    for sql in PRODUCTS_FTS_TRIGGERS_SQL:
+        conn.execute(sql)
+    conn.execute("DELETE FROM PRODUCTS_FTS;")
+    conn.execute("INSERT INTO PRODUCTS_FTS (PRODUCT) SELECT PRODUCT FROM PRODUCTS;")
+
+
+# thumbnails of PICTURES, WIDTH and HEIGHT are the size they were made for
+THUMBNAILS_SQL = [
+    """CREATE TABLE IF NOT EXISTS PICTURE_THUMBNAILS (
+       PRODUCT TEXT PRIMARY KEY,
+       WIDTH INTEGER NOT NULL,
+       HEIGHT INTEGER NOT NULL,
+       IMAGE BLOB NOT NULL
+       );""",
+    # INSERT OR REPLACE of a picture does not fire the delete trigger, so inserts also remove old thumbnails
+    """CREATE TRIGGER IF NOT EXISTS trg_pictures_thumbnail_insert AFTER INSERT ON PICTURES
+       BEGIN
+           DELETE FROM PICTURE_THUMBNAILS WHERE PRODUCT = NEW.PRODUCT;
+       END;""",
+    """CREATE TRIGGER IF NOT EXISTS trg_pictures_thumbnail_update AFTER UPDATE ON PICTURES
+       BEGIN
+           DELETE FROM PICTURE_THUMBNAILS WHERE PRODUCT IN (OLD.PRODUCT, NEW.PRODUCT);
+       END;""",
+    """CREATE TRIGGER IF NOT EXISTS trg_pictures_thumbnail_delete AFTER DELETE ON PICTURES
+       BEGIN
+           DELETE FROM PICTURE_THUMBNAILS WHERE PRODUCT = OLD.PRODUCT;
+       END;""",
+]
+
+def key_users_by_email(conn):
+    # CalorieCounting wrote NORM_HISTORY and ANALYTICS_STATE under the user name, the rows of a name that belongs
+    # to one user are moved to the email (a row of the email on the same date wins), the analytics state of
+    # a name is dropped and rebuilt on the next refresh
+    conn.execute("""UPDATE OR IGNORE NORM_HISTORY SET USER = (SELECT EMAIL FROM USERS WHERE NAME = NORM_HISTORY.USER)
+                    WHERE USER NOT IN (SELECT EMAIL FROM USERS)
+                      AND (SELECT COUNT(*) FROM USERS WHERE NAME = NORM_HISTORY.USER) = 1;""")
+    conn.execute("""DELETE FROM NORM_HISTORY
+                    WHERE USER NOT IN (SELECT EMAIL FROM USERS)
+                      AND (SELECT COUNT(*) FROM USERS WHERE NAME = NORM_HISTORY.USER) = 1;""")
+    conn.execute("DELETE FROM ANALYTICS_STATE WHERE USER NOT IN (SELECT EMAIL FROM USERS);")
+
+
+MIGRATIONS = [
+    (1, "create base tables", BASE_TABLES_SQL),
+    (2, "remove primary key from NUTRITION.USER", fix_nutrition_primary_key),
+    (3, "add indexes on USER/DATE hot keys", HOT_KEY_INDEXES_SQL),
+    (4, "maintain CONSUMED totals by triggers", CONSUMED_TRIGGERS_SQL),
+    (5, "add weekly and monthly rollups of CONSUMED", ROLLUPS_SQL),
+    (6, "store daily norms as a change log", create_norm_history),
+    (7, "add state table of rolling analytics", ANALYTICS_STATE_SQL),
+    (8, "add full-text index of product names", create_products_fts),
+    (9, "add thumbnails of product pictures", THUMBNAILS_SQL),
+    (10, "key norm history and analytics state by user email", key_users_by_email),
+]
+
+# (name, query, index that must be used), the app runs the same strings from hot_queries.py
+HOT_QUERIES = [
+    ("today nutrition", TODAY_NUTRITION_SQL, "idx_nutrition_user_date"),
+    ("remove consumed product", REMOVE_CONSUMED_PRODUCT_SQL, "idx_nutrition_user_date"),
+    ("daily totals", DAILY_TOTALS_SQL, "idx_consumed_user_date"),
+    ("daily totals of a period", DAILY_TOTALS_RANGE_SQL, "idx_consumed_user_date"),
+    ("first record date", FIRST_RECORD_DATE_SQL, "idx_consumed_user_date"),
+    ("weekly totals of a period", ROLLUP_TOTALS_RANGE_SQL["week"], "sqlite_autoindex_WEEKLY_TOTALS_1"),
+    ("monthly totals of a period", ROLLUP_TOTALS_RANGE_SQL["month"], "sqlite_autoindex_MONTHLY_TOTALS_1"),
+    ("norm history of user", NORM_HISTORY_SQL, "sqlite_autoindex_NORM_HISTORY_1"),
+    ("activities of the day",
+     "SELECT * FROM activities WHERE date = ?",
+     "idx_activities_date"),
+    ("user activities of the day",
+     "SELECT * FROM activities WHERE user_id = ? AND date = ?",
+     "idx_activities_user_date"),
+]
+
+_migrated_files = set()
+
+
+def get_schema_version(db_name):
+    return DBControl.connect(db_name).execute("PRAGMA user_version;").fetchone()[0]
+
+
+def apply_migrations(db_name):
+    # Apply all migrations that are newer than the version of the database, each in its own transaction
+    key = os.path.abspath(db_name)
+    if key in _migrated_files:
+        return
+
+    # an up to date database is only read, so clients starting at the same time do not wait for the write lock
+    if get_schema_version(db_name) >= MIGRATIONS[-1][0]:
+        _migrated_files.add(key)
+        return
+
+    for number, description, steps in MIGRATIONS:
+        with DBControl.transaction(db_name) as conn:
+            version = conn.execute("PRAGMA user_version;").fetchone()[0]
+            if number <= version:
+                continue
+
+            if callable(steps):
+                steps(conn)
+            else:
+                for sql in steps:
+                    conn.execute(sql)
+
+            conn.execute(f"PRAGMA user_version = {number};")
+        print(f"[INFO] Migration {number} applied: {description}")
+
+    _migrated_files.add(key)
+
+
+def has_products_fts(db_name):
+    # True if the database has the full-text index of products (migration 8 with FTS5 available)
+    return DBControl.data_exists(db_name, "sqlite_master", "name", "type = 'table' AND name = 'PRODUCTS_FTS'")
+
+
+def explain_query(db_name, sql):
+    # Get EXPLAIN QUERY PLAN of the query as one string, parameters are not needed for the plan
+    conn = DBControl.connect(db_name)
+    placeholders = sql.count("?")
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", (None,) * placeholders).fetchall()
+    return "\n".join(row[-1] for row in rows)
+
+
+def check_hot_query_plans(db_name):
+    # Returns list of (name, plan) of the hot queries that do not use their index
+    failed = []
+    for name, sql, index_name in HOT_QUERIES:
+        plan = explain_query(db_name, sql)
+        if f"INDEX {index_name}" not in plan:
+            failed.append((name, plan))
+    return failed
+
+
+def verify_consumed_totals(db_name, repair=False, tolerance=0.01):
+    # Rebuild CONSUMED totals from NUTRITION with one GROUP BY and compare them with the stored ones,
+    # returns list of (user, date, stored totals, rebuilt totals), repair=True writes rebuilt totals
+    totals = ", ".join(total for total, _ in TOTAL_COLUMNS)
+    rebuilt_sql = f"""SELECT USER, DATE, {', '.join(f'SUM({value}) AS {total}' for total, value in TOTAL_COLUMNS)}
+                      FROM NUTRITION GROUP BY USER, DATE"""
+    stored = ", ".join(f"IFNULL(C.{total}, 0)" for total, _ in TOTAL_COLUMNS)
+    rebuilt = ", ".join(f"IFNULL(R.{total}, 0)" for total, _ in TOTAL_COLUMNS)
+    differs = " OR ".join(f"ABS(IFNULL(C.{total}, 0) - IFNULL(R.{total}, 0)) > ?" for total, _ in TOTAL_COLUMNS)
+
+    # FULL OUTER JOIN is not available in older sqlite, so days that exist only in one table are added by UNION
+    mismatches_sql = f"""WITH R AS ({rebuilt_sql})
+                         SELECT C.USER, C.DATE, {stored}, {rebuilt}
+                         FROM CONSUMED C LEFT JOIN R ON R.USER = C.USER AND R.DATE = C.DATE
+                         WHERE {differs}
+                         UNION ALL
+                         SELECT R.USER, R.DATE, {stored}, {rebuilt}
+                         FROM R LEFT JOIN CONSUMED C ON C.USER = R.USER AND C.DATE = R.DATE
+                         WHERE C.USER IS NULL
+                         ORDER BY 1, 2;"""
+    count = len(TOTAL_COLUMNS)
+
+    with DBControl.transaction(db_name):
+        rows = DBControl.query_data(db_name, mismatches_sql, (tolerance,) * count)
+        mismatches = [(row[0], row[1], row[2:2 + count], row[2 + count:]) for row in rows]
+
+        if repair and mismatches:
+            DBControl.execute_sql(db_name, f"UPDATE CONSUMED SET {', '.join(f'{total} = 0' for total, _ in TOTAL_COLUMNS)};")
+            DBControl.execute_sql(db_name, f"""INSERT INTO CONSUMED (USER, DATE, {totals},
+                                                                     NORM_PROTEINS, NORM_FATS, NORM_CARBOHYDRATES, NORM_KCAL)
+                                               SELECT *, -1, -1, -1, -1 FROM ({rebuilt_sql}) WHERE true
+                                               ON CONFLICT(USER, DATE) DO UPDATE SET {', '.join(f'{total} = excluded.{total}' for total, _ in TOTAL_COLUMNS)};""")
+
+    if repair and mismatches:
+        totals_cache.clear()
+
+    return mismatches
+
+
+def rebuild_rollups(db_name):
+    # Regenerate WEEKLY_TOTALS and MONTHLY_TOTALS from CONSUMED in one transaction,
+    # returns {period type: number of rows}
+    counts = {}
+    with DBControl.transaction(db_name) as conn:
+        for period_type, (table, period_start) in ROLLUP_TABLES.items():
+            for sql in _rebuild_rollup_sql(table, period_start):
+                conn.execute(sql)
+            counts[period_type] = conn.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
+    return counts
+
+
+if __name__ == "__main__":
+    db_name = sys.argv[1] if len(sys.argv) > 1 else "Health_database.db"
+    apply_migrations(db_name)
+    print(f"Schema version: {get_schema_version(db_name)}")
+
+    if "--check" in sys.argv:
+        for name, sql, index_name in HOT_QUERIES:
+            print(f"\n{name}:\n{explain_query(db_name, sql)}")
+
+        failed = check_hot_query_plans(db_name)
+        if failed:
+            print(f"\nQueries without index: {', '.join(name for name, _ in failed)}")
+            sys.exit(1)
+        print("\nAll hot queries use indexes")
+
+    if "--verify-totals" in sys.argv:
+        repair = "--repair" in sys.argv
+        mismatches = verify_consumed_totals(db_name, repair)
+        for user, day, stored, rebuilt in mismatches:
+            print(f"{user} {day}: stored {stored}, from NUTRITION {rebuilt}")
+        print(f"{len(mismatches)} mismatched days" + (" repaired" if repair and mismatches else ""))
+
+    if "--rebuild-rollups" in sys.argv:
+        for period_type, count in rebuild_rollups(db_name).items():
+            print(f"{ROLLUP_TABLES[period_type][0]}: {count} rows")
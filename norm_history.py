@@ -0,0 +1,102 @@
+import os
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+from DB_control import DBControl
+from hot_queries import NORM_HISTORY_SQL
+
+# Daily norms are stored as a change log: NORM_HISTORY has one row per (user, effective from date),
+# a norm is in effect from its date until the next row of the user. The rows of a user are loaded once
+# into sorted lists and the norm of any date is found with bisect.
+#
+#       history = get_norm_history("Health_database.db", "TestUser")
+#       history.norm_on(date(2025, 3, 1))            # (protein, fat, carb, kcal) or None
+#       history.record(date.today(), (150.2, 66.8, 200.2, 2002))     # new row only if the norm changed
+#
+# norms are (protein, fat, carb, kcal), the same values that were copied to CONSUMED.NORM_* before
+
+NORM_COLUMNS = ["NORM_PROTEINS", "NORM_FATS", "NORM_CARBOHYDRATES", "NORM_KCAL"]
+
+
+class NormHistory:
+    def __init__(self, db_name, user):
+        self.db_name = db_name
+        self.user = user
+        self._lock = threading.Lock()
+        self.dates = []
+        self.norms = []
+        self.load()
+
+    def load(self):
+        # Read the change log of the user, rows come sorted by the primary key
+        rows = DBControl.iter_query(self.db_name, NORM_HISTORY_SQL, (self.user,))
+        dates, norms = [], []
+        for row in rows:
+            dates.append(row[0])
+            norms.append(tuple(row[1:]))
+
+        with self._lock:
+            self.dates, self.norms = dates, norms
+
+    def norm_on(self, day):
+        # Norm in effect on the day, days before the first change get the first known norm, None if there are no rows
+        with self._lock:
+            if not self.dates:
+                return None
+            index = bisect_right(self.dates, str(day)) - 1
+            return self.norms[max(index, 0)]
+
+    def record(self, day, norm):
+        # Store the norm from the day if it differs from the one in effect, returns True if the log was changed
+        day = str(day)
+        norm = tuple(norm)
+        with self._lock:
+            index = bisect_right(self.dates, day) - 1
+            if index >= 0 and self.norms[index] == norm:
+                return False
+
+            DBControl.execute_sql(
+                self.db_name,
+                f"""INSERT INTO NORM_HISTORY (USER, EFFECTIVE_FROM, {', '.join(NORM_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(USER, EFFECTIVE_FROM) DO UPDATE SET
+                    {', '.join(f'{column} = excluded.{column}' for column in NORM_COLUMNS)};""",
+                (self.user, day, *norm)
+            )
+
+            if index >= 0 and self.dates[index] == day:
+                self.norms[index] = norm
+            else:
+                self.dates.insert(index + 1, day)
+                self.norms.insert(index + 1, norm)
+            return True
+
+    def __len__(self):
+        return len(self.dates)
+
+
+_histories = OrderedDict()
+_histories_lock = threading.Lock()
+MAX_HISTORIES = 1024
+
+
+def get_norm_history(db_name, user):
+    # Shared NormHistory of the user, the least recently used ones are dropped after MAX_HISTORIES
+    key = (os.path.abspath(db_name), user)
+    with _histories_lock:
+        history = _histories.get(key)
+        if history is not None:
+            _histories.move_to_end(key)
+            return history
+
+    history = NormHistory(db_name, user)
+    with _histories_lock:
+        history = _histories.setdefault(key, history)
+        while len(_histories) > MAX_HISTORIES:
+            _histories.popitem(last=False)
+    return history
+
+
+def clear_norm_histories():
+    with _histories_lock:
+        _histories.clear()
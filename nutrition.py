@@ -1,5 +1,15 @@
+import re
+import sqlite3
 from datetime import date
 from DB_control import DBControl
+from migrations import apply_migrations, has_products_fts
+from db_worker import get_worker
+from totals_cache import totals_cache
+from product_cache import product_cache
+from product_search import get_product_index
+from thumbnails import get_thumbnail
+from hot_queries import TODAY_NUTRITION_SQL, REMOVE_CONSUMED_PRODUCT_SQL
+from pictures import read_picture, probe_picture
 
 # products_table_sql = """CREATE TABLE IF NOT EXISTS PRODUCTS (
 #                         PRODUCT TEXT PRIMARY KEY,
@@ -25,6 +35,9 @@ from DB_control import DBControl
 #                         CONSUMED_KCAL INTEGER NOT NULL
 #                         );"""
 
+# words shorter than this are not searched alone when no name has all words of the query, see search_products
+FALLBACK_MIN_WORD = 3
+
 class Nutrition:
     def __init__(self, user, db_name = "Health_database.db"):
         self.user_email = user.email
@@ -36,143 +49,153 @@ class Nutrition:
         self.nutrition_columns = ["USER", "DATE", "PRODUCT", "CONSUMED_MASS", "CONSUMED_PROTEINS", "CONSUMED_FATS", "CONSUMED_CARBOHYDRATES", "CONSUMED_KCAL"]
         self.consumed_columns = ["USER", "DATE", "TOTAL_MASS", "TOTAL_PROTEINS", "TOTAL_FATS", "TOTAL_CARBOHYDRATES", "TOTAL_KCAL", "NORM_PROTEINS", "NORM_FATS", "NORM_CARBOHYDRATES", "NORM_KCAL"]
 
-        nutrition_table_sql = """CREATE TABLE IF NOT EXISTS NUTRITION (
-                                 USER TEXT PRIMARY KEY,
-                                 DATE DATE NOT NULL,
-                                 PRODUCT TEXT NOT NULL,
-                                 CONSUMED_MASS REAL NOT NULL,
-                                 CONSUMED_PROTEINS REAL NOT NULL,
-                                 CONSUMED_FATS REAL NOT NULL,
-                                 CONSUMED_CARBOHYDRATES REAL NOT NULL,
-                                 CONSUMED_KCAL INTEGER NOT NULL
-                                 );"""
-
-        consumed_table_sql = """CREATE TABLE IF NOT EXISTS CONSUMED (
-                                 USER TEXT NOT NULL,
-                                 DATE DATE NOT NULL,
-                                 TOTAL_MASS REAL NOT NULL,
-                                 TOTAL_PROTEINS REAL NOT NULL,
-                                 TOTAL_FATS REAL NOT NULL,
-                                 TOTAL_CARBOHYDRATES REAL NOT NULL,
-                                 TOTAL_KCAL INTEGER NOT NULL,
-                                 NORM_PROTEINS REAL NOT NULL,
-                                 NORM_FATS REAL NOT NULL,
-                                 NORM_CARBOHYDRATES REAL NOT NULL,
-                                 NORM_KCAL INTEGER NOT NULL
-                                 );"""
-
-        # making sure that table is existed in database
-        self.db.create_table(self.db_name, nutrition_table_sql)
-        self.db.create_table(self.db_name, consumed_table_sql)
+        # making sure that tables and indexes are existed in database
+        apply_migrations(self.db_name)
+        self.products_fts = has_products_fts(self.db_name)
 
         # self.db.delete_data(self.db_name, self.nutrition_table_name)                    #----------------------------
         # self.db.delete_data(self.db_name, self.consumed_table_name)                     #----------------------------
     
     def add_consumed_product(self, product_name, product_mass):
-        data = self.db.receive_data(self.db_name, self.products_table_name, "*", f"PRODUCT = '{product_name}'")
-        for record in data:
-              product, proteins, fats, carbohydrates, kcal = record
-       
-        values = [f"'{self.user_email}'", f"'{date.today()}'", f"'{product}'", round(float(product_mass), 2), round((proteins / 100) * float(product_mass), 2), round((fats / 100) * float(product_mass), 2), round((carbohydrates / 100) * float(product_mass), 2), round((kcal / 100) * float(product_mass), 2)]
-    
-        sql = f"INSERT INTO {self.nutrition_table_name} ({", ".join(self.nutrition_columns)}) VALUES({", ".join(str(v) for v in values)});"
-        self.db.insert_data(self.db_name, sql)
-    
-        self.update_consumed_table(values.copy())
-
-        print("\nNUTRITION:")                                                           #----------------------------
-        nutr = self.db.receive_data(self.db_name, self.nutrition_table_name, "*")       #----------------------------
-        for v in nutr:                                                                  #----------------------------
-            print(v)                                                                    #----------------------------
+        # the product was usually just checked by check_product, so its record comes from the cache
+        product, proteins, fats, carbohydrates, kcal = self.get_product_record(product_name)
 
-        print("\nCONSUMED:")                                                            #----------------------------
-        cons = self.db.receive_data(self.db_name, self.consumed_table_name, "*")        #----------------------------
-        for v in cons:                                                                  #----------------------------
-            print(v)                                                                    #----------------------------
+        values = [self.user_email, date.today().isoformat(), product, round(float(product_mass), 2), round((proteins / 100) * float(product_mass), 2), round((fats / 100) * float(product_mass), 2), round((carbohydrates / 100) * float(product_mass), 2), round((kcal / 100) * float(product_mass), 2)]
+    
+        # day totals in CONSUMED are updated by the trigger on NUTRITION
+        sql = f"INSERT INTO {self.nutrition_table_name} ({', '.join(self.nutrition_columns)}) VALUES ({', '.join('?' * len(values))});"
+        if self.db.execute_sql(self.db_name, sql, values):
+            # the row is committed, cached totals of the day are updated in place
+            totals_cache.add(totals_cache.make_key(self.db_name, self.user_email, values[1]), values[4:8])
 
-        values[2] = product
         return values
-            
-    def update_consumed_table(self, nutrition_values):
-        nutrition_last_date = self.db.receive_data(self.db_name, self.nutrition_table_name, "DATE", f"USER = '{self.user_email}' AND (DATE = (SELECT MAX(DATE) FROM {self.nutrition_table_name}))")
-        is_current_date = self.db.data_exists(self.db_name, self.consumed_table_name, "*", f"USER = '{self.user_email}' AND DATE = '{nutrition_last_date[0][0]}'")
-
-        if is_current_date:
-            old_data = self.db.receive_data(self.db_name, self.consumed_table_name, "*", f"USER = '{self.user_email}' AND DATE = '{date.today()}'")
-        
-            for record in old_data:
-                old_user, old_date, old_mass, old_proteins, old_fats, old_carbohydrates, old_kcal, old_norm_p, old_norm_f, old_norm_c, old_norm_k = record
-
-            nutrition_values[3] += old_mass
-            nutrition_values[4] += old_proteins
-            nutrition_values[5] += old_fats
-            nutrition_values[6] += old_carbohydrates
-            nutrition_values[7] += old_kcal
-        
-            self.db.update_data(self.db_name, self.consumed_table_name, self.consumed_columns[2:7], nutrition_values[3:8], f"USER = '{self.user_email}' AND DATE = '{nutrition_last_date[0][0]}'")
-        else:
-            insert_sql = f"INSERT INTO {self.consumed_table_name} ({", ".join(self.consumed_columns)}) VALUES ({", ".join(str(v) for v in (nutrition_values[:2] + nutrition_values[3:]))}, -1, -1, -1, -1);"
-            self.db.insert_data(self.db_name, insert_sql)
         
     def show_today_consumption(self):
-        nutrition = self.db.receive_data(self.db_name, self.nutrition_table_name, "*")
-        consumed = self.db.receive_data(self.db_name, self.consumed_table_name, "*")    #----------------------------
-
-        print("Nutrition table:")                                                       #----------------------------
-        for my_list in nutrition:                                                       #----------------------------
-            print(my_list)                                                              #----------------------------
-
-        print("\nConsumed table:")                                                      #----------------------------
-        for my_list in consumed:                                                        #----------------------------
-            print(my_list)                                                              #----------------------------
-
-        today_nutrition = self.db.receive_data(self.db_name, self.nutrition_table_name, "*", f"USER = '{self.user_email}' AND DATE = '{date.today()}'")
+        today_nutrition = self.db.query_data(self.db_name, TODAY_NUTRITION_SQL, (self.user_email, date.today().isoformat()))
         return today_nutrition
 
     def get_all_products_list(self):
-        product_list = self.db.receive_data(self.db_name, self.products_table_name, "PRODUCT")
-        list_values = [k[0] for k in product_list]
+        list_values = [k[0] for k in self.db.iter_data(self.db_name, self.products_table_name, "PRODUCT")]
 
         return list_values
 
+    def get_product_index(self):
+        # Type-ahead search index of the product names, built once per database
+        return get_product_index(self.db_name, self.get_all_products_list)
+
+    def search_products(self, query, limit=20):
+        # Product names that have all words of the query (the words may be unfinished), the best ones first:
+        # names that start with the query (found by the primary key, the exact name first), then the other
+        # matches by FTS rank. If no name has all of the words (a typo), names with any of them are returned.
+        # Without FTS5 the in-memory index of product_search is used.
+        if not self.products_fts:
+            return self.get_product_index().search(query, limit)
+
+        words = re.findall(r"[^\W_]+", query.casefold())
+        if not words:
+            rows = self.db.query_data(self.db_name, f"SELECT PRODUCT FROM {self.products_table_name} ORDER BY PRODUCT LIMIT ?;", (limit,))
+            return [row[0] for row in rows]
+
+        found = self.search_product_prefix(query.strip(), limit)
+        if len(found) >= limit:
+            return found
+
+        # the other matches, a name found by the prefix is skipped (bm25() is the rank, called directly it is faster)
+        search_sql = """SELECT PRODUCT FROM PRODUCTS_FTS WHERE PRODUCTS_FTS MATCH ? ORDER BY bm25(PRODUCTS_FTS) LIMIT ?;"""
+        terms = [f'"{word}"*' for word in words]
+
+        rows = self.db.query_data(self.db_name, search_sql, (" ".join(terms), limit + len(found)))
+        if not rows and not found and len(terms) > 1:
+            # units and numbers ("g", "100") are in most names, ranking all of them is slow and tells nothing
+            rare_terms = [f'"{word}"*' for word in words if len(word) >= FALLBACK_MIN_WORD and not word.isdigit()]
+            if rare_terms:
+                rows = self.db.query_data(self.db_name, search_sql, (" OR ".join(rare_terms), limit))
+
+        seen = set(found)
+        for row in rows:
+            if row[0] not in seen and len(found) < limit:
+                seen.add(row[0])
+                found.append(row[0])
+        return found
+
+    def search_product_prefix(self, prefix, limit=20):
+        # Names that start with the prefix as typed, in lower case or capitalized, by ranges of the primary key
+        # (PRODUCT >= prefix AND PRODUCT < prefix + the last Unicode character), the exact name first, then the shortest
+        prefix_sql = f"""SELECT PRODUCT FROM {self.products_table_name}
+                         WHERE PRODUCT >= ? AND PRODUCT < ? ORDER BY PRODUCT LIMIT ?;"""
+        found = set()
+        for variant in dict.fromkeys((prefix, prefix.lower(), prefix[:1].upper() + prefix[1:], prefix.capitalize())):
+            rows = self.db.query_data(self.db_name, prefix_sql, (variant, variant + "\U0010ffff", limit))
+            found.update(row[0] for row in rows)
+
+        query = prefix.casefold()
+        return sorted(found, key=lambda name: (name.casefold() != query, len(name), name))[:limit]
+
+    def get_product_record(self, product_name):
+        # (product, proteins, fats, carbohydrates, kcal) per 100 g or None, through the shared product cache
+        key = product_cache.make_key(self.db_name, product_name)
+        record = product_cache.get(key)
+        if record is not None:
+            return record
+
+        # missing products are not cached, a failed read must not hide an existing one
+        generation = product_cache.generation
+        data = self.db.receive_data(self.db_name, self.products_table_name, "*", "PRODUCT = ?", (product_name,))
+        if not data:
+            return None
+        product_cache.put(key, data[0], generation)
+        return data[0]
+
     def check_product(self, product_name):
-        return self.db.data_exists(self.db_name, self.products_table_name, "PRODUCT", f"PRODUCT = '{product_name}'")
+        return self.get_product_record(product_name) is not None
 
     def remove_consumed_product(self, product_name, product_mass):
-        product_list = self.db.receive_data(self.db_name, self.nutrition_table_name, "ROWID, *", f"USER = '{self.user_email}' AND DATE = '{date.today()}' AND PRODUCT = '{product_name}' AND CONSUMED_MASS = {product_mass}")
+        # Delete one row of the product eaten today, returns number of deleted rows (0 if there was none or on error)
+        today = date.today().isoformat()
+
+        # one product row is deleted, the trigger subtracts it from the day totals
+        try:
+            with self.db.transaction(self.db_name):
+                deleted = self.db.query_data(self.db_name, REMOVE_CONSUMED_PRODUCT_SQL, (self.user_email, today, product_name, product_mass))
+        except sqlite3.Error as e:
+            print(f"Error in remove_consumed_product function: {e}")
+            return 0
+
+        # the deleted row values are subtracted from the cached totals of the day after the commit
+        for row in deleted:
+            totals_cache.subtract(totals_cache.make_key(self.db_name, self.user_email, today), row)
+        return len(deleted)
 
-        if product_list:
-            rowid = product_list[0][0]
-            self.db.delete_specific_data(self.db_name, self.nutrition_table_name, f"ROWID = {rowid}")
+    def get_product_image(self, product_name):
+        # the picture is read from its blob handle (see pictures.py), None if there is none
+        return read_picture(self.db_name, product_name)
 
-            deleted_product = list(product_list[0][4:9])
-            
-            consumed_values = self.db.receive_data(self.db_name, self.consumed_table_name, "TOTAL_MASS, TOTAL_PROTEINS, TOTAL_FATS, TOTAL_CARBOHYDRATES, TOTAL_KCAL", f"USER = '{self.user_email}' AND DATE = '{date.today()}'")
-            for consumed_records in consumed_values:
-                mass, proteins, fats, carbohydrates, kcal = consumed_records
+    def probe_product_image(self, product_name):
+        # {"format", "width", "height", "bytes"} of the picture from its header only, None if there is none
+        return probe_picture(self.db_name, product_name)
 
-            deleted_product[0] = mass - deleted_product[0]
-            deleted_product[1] = proteins - deleted_product[1]
-            deleted_product[2] = fats - deleted_product[2]
-            deleted_product[3] = carbohydrates - deleted_product[3]
-            deleted_product[4] = kcal - deleted_product[4]
+    def get_product_thumbnail(self, product_name):
+        # Picture resized for the window (see thumbnails.py), None if the product has no picture
+        return get_thumbnail(self.db_name, product_name)
 
-            self.db.update_data(self.db_name, self.consumed_table_name, self.consumed_columns[2:7], deleted_product, f"USER = '{self.user_email}' AND DATE = '{date.today()}'")
+    # ------------------   Async variants, run in the background DB worker and return Future   ------------------
+    def add_consumed_product_async(self, product_name, product_mass):
+        return get_worker().submit(self.add_consumed_product, product_name, product_mass)
 
-        nutrition = self.db.receive_data(self.db_name, self.nutrition_table_name, "*")  #----------------------------
-        consumed = self.db.receive_data(self.db_name, self.consumed_table_name, "*")    #----------------------------
+    def remove_consumed_product_async(self, product_name, product_mass):
+        return get_worker().submit(self.remove_consumed_product, product_name, product_mass)
 
-        print("Nutrition table:")                                                       #----------------------------
-        for my_list in nutrition:                                                       #----------------------------
-            print(my_list)                                                              #----------------------------
+    def show_today_consumption_async(self):
+        return get_worker().submit(self.show_today_consumption)
 
-        print("\nConsumed table:")                                                      #----------------------------
-        for my_list in consumed:                                                        #----------------------------
-            print(my_list)                                                              #----------------------------
+    def search_products_async(self, query, limit=20):
+        return get_worker().submit(self.search_products, query, limit)
 
-    def get_product_image(self, product_name):
-        result = self.db.receive_data(self.db_name, "PICTURES", "IMAGE", f"PRODUCT = '{product_name}'")
+    def check_product_async(self, product_name):
+        return get_worker().submit(self.check_product, product_name)
+
+    def get_product_image_async(self, product_name):
+        return get_worker().submit(self.get_product_image, product_name)
 
-        if result:
-            return result[0][0]
-        return None
\ No newline at end of file
+    def get_product_thumbnail_async(self, product_name):
+        return get_worker().submit(self.get_product_thumbnail, product_name)
@@ -2,9 +2,20 @@ from tkinter import ttk, messagebox
 
 import customtkinter as ctk
 from nutrition import Nutrition
+from db_worker import deliver
 from PIL import Image
 import io
 import tkinter as tk
+from collections import OrderedDict
+
+# products shown in the drop-down list while the name is typed
+PRODUCT_SEARCH_LIMIT = 50
+# keys that move through the list, they do not change the typed text
+NAVIGATION_KEYS = {"Up", "Down", "Left", "Right", "Return", "Escape", "Tab", "Home", "End"}
+# ready images of the last selected products, reselecting one of them does not touch the database
+IMAGE_CACHE_SIZE = 64
+IMAGE_SIZE = (100, 100)
+PLACEHOLDER_PRODUCT = "Select product"
 
 class Func_Button(ctk.CTkButton):
     def __init__(self, master, **kwargs):
@@ -67,6 +78,9 @@ class NutritionWindow(ctk.CTkFrame):
         self.nutrition_functions = Nutrition(user)
 
         self.image_frame = None
+        self.image_label = None
+        self.images = OrderedDict()
+        self.placeholder_image = None
         self.tree = None
         self.combo = None
         self.mass_enter = None
@@ -103,13 +117,16 @@ class NutritionWindow(ctk.CTkFrame):
         self.mass_enter = Enter.create(self.content_frame, new_text="Enter grams", x_position=0, y_position=60,
                                        corner_radius=7)
 
-        table_values = self.nutrition_functions.get_all_products_list()
-
-        self.combo = ttk.Combobox(self.content_frame, values=table_values, height=4, font = ("Inter", 15))
+        self.combo = ttk.Combobox(self.content_frame, values=[], height=4, font = ("Inter", 15))
         self.combo.set("Select product")
         self.combo.bind("<<ComboboxSelected>>", self.on_product_selected)
+        self.combo.bind("<KeyRelease>", self.on_product_typed)
+        self.combo.bind("<FocusIn>", self.on_combo_focus)
         self.combo.place(x=0, y=0, width=610, height=50)
 
+        # the whole catalog is not put into the list, products are searched in the database as the user types
+        self.search_products("")
+
         # ------------------   Making table in the Content Frame   ------------------
         table_frame = tk.Frame(self.content_frame, width=740, height=360, background="#E6E4E4")
         # table_frame.place(x = 0, y = 106)
@@ -135,9 +152,7 @@ class NutritionWindow(ctk.CTkFrame):
             self.tree.heading(col_var, text=col_name)
             self.tree.column(col_var, width=col_width, anchor=col_anchor)
 
-        start_rows = self.nutrition_functions.show_today_consumption()
-        for row in start_rows:
-            self.insert_row_to_table(list(row))
+        self.show_recorded_rows()
 
         vsb = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
         self.tree.configure(yscrollcommand=vsb.set)
@@ -153,8 +168,18 @@ class NutritionWindow(ctk.CTkFrame):
         self.image_frame = ctk.CTkFrame(self.content_frame, width=100, height=100, fg_color="#E6E4E4", corner_radius=7)
         self.image_frame.place(x=640, y=0)
 
-        image_blob = self.nutrition_functions.get_product_image("Select product")
-        self.set_image(image_blob)
+        self.image_label = ctk.CTkLabel(self.image_frame, text="")
+        self.image_label.pack(expand=True)
+
+        # the placeholder is loaded once and shown for every product without a picture
+        def on_loaded(image_blob):
+            self.placeholder_image = self.make_image(image_blob)
+            # a product picture could be shown before the placeholder came
+            if self.image_label.image is None:
+                self.set_image(self.placeholder_image)
+
+        self.image_label.image = None
+        deliver(self, self.nutrition_functions.get_product_thumbnail_async(PLACEHOLDER_PRODUCT), on_loaded)
 
     # ------------------   Making a button for specific product deletion   ------------------
     def create_removal_section(self):
@@ -164,28 +189,57 @@ class NutritionWindow(ctk.CTkFrame):
                                                 fg_color="#C75858", hover_color="#A34848", corner_radius=7, command = self.remove_product)
          
     # ------------------   Functional methods   ------------------
+    def on_combo_focus(self, event):
+        if self.combo.get() == "Select product":
+            self.combo.set("")
+
+    def on_product_typed(self, event):
+        if event.keysym not in NAVIGATION_KEYS:
+            self.search_products(self.combo.get())
+
+    def search_products(self, text):
+        def on_found(products):
+            # results of older keystrokes are not shown over the newer text
+            if self.combo.get() in (text, "Select product"):
+                self.combo["values"] = products
+
+        deliver(self, self.nutrition_functions.search_products_async(text, PRODUCT_SEARCH_LIMIT), on_found)
+
     def on_product_selected(self, event):
         product = self.combo.get()
 
-        for widget in self.image_frame.winfo_children():
-            widget.destroy()
-
-        image_blob = self.nutrition_functions.get_product_image(product)
+        image = self.images.get(product)
+        if image is not None:
+            self.images.move_to_end(product)
+            self.set_image(image)
+            return
 
+        def on_loaded(image_blob):
+            image = self.make_image(image_blob) if image_blob else self.placeholder_image
+            # the placeholder is not cached while it is still loading
+            if image is not None:
+                self.images[product] = image
+            while len(self.images) > IMAGE_CACHE_SIZE:
+                self.images.popitem(last=False)
+            # another product could be selected while this one was loading
+            if self.combo.get() == product:
+                self.set_image(image)
+
+        deliver(self, self.nutrition_functions.get_product_thumbnail_async(product), on_loaded)
+
+    def make_image(self, image_blob):
+        # CTkImage of the thumbnail, a picture of another size is resized
         if not image_blob:
-            image_blob = self.nutrition_functions.get_product_image("Select product")
-        
-        self.set_image(image_blob)
-        
-    def set_image(self, image_blob):
+            return None
         image = Image.open(io.BytesIO(image_blob))
-        image = image.resize((100, 100))
-
-        ctk_image = ctk.CTkImage(light_image=image, size=(100, 100))
-
-        image_label = ctk.CTkLabel(self.image_frame, image=ctk_image, text="")
-        image_label.image = ctk_image
-        image_label.pack(expand=True)
+        if image.size != IMAGE_SIZE:
+            image = image.resize(IMAGE_SIZE)
+        return ctk.CTkImage(light_image=image, size=IMAGE_SIZE)
+
+    def set_image(self, ctk_image):
+        if ctk_image is not None:
+            self.image_label.configure(image=ctk_image)
+            self.image_label.image = ctk_image
         
     def is_number(self, value):
         try:
@@ -197,9 +251,12 @@ class NutritionWindow(ctk.CTkFrame):
             return False
 
     def show_recorded_rows(self):
-        start_rows = self.nutrition_functions.show_today_consumption()
-        for row in start_rows:
-            self.insert_row_to_table(list(row))
+        # rows of today are read in the background worker and added to the table when they come
+        def on_loaded(rows):
+            for row in rows:
+                self.insert_row_to_table(list(row))
+
+        deliver(self, self.nutrition_functions.show_today_consumption_async(), on_loaded)
         
     def insert_row_to_table(self, values_list):
         row_number = len(self.tree.get_children()) + 1
@@ -211,13 +268,17 @@ class NutritionWindow(ctk.CTkFrame):
         product = self.combo.get()
         mass = self.mass_enter.get()
 
-        if not self.nutrition_functions.check_product(product):
-            messagebox.showerror("Error", "Choose product from the list!")
-        elif not self.is_number(mass):
-            messagebox.showerror("Error", "Enter valid amount of grams of product!")
-        else:
-            product_values = self.nutrition_functions.add_consumed_product(product, mass)
-            self.insert_row_to_table(product_values)
+        # database work is done in the background worker, results come back to the Tk thread
+        def on_checked(product_exists):
+            if not product_exists:
+                messagebox.showerror("Error", "Choose product from the list!")
+            elif not self.is_number(mass):
+                messagebox.showerror("Error", "Enter valid amount of grams of product!")
+            else:
+                future = self.nutrition_functions.add_consumed_product_async(product, mass)
+                deliver(self, future, self.insert_row_to_table)
+
+        deliver(self, self.nutrition_functions.check_product_async(product), on_checked)
 
         self.mass_enter.delete(0, 'end')
 
@@ -238,13 +299,21 @@ class NutritionWindow(ctk.CTkFrame):
         item_to_remove = all_items[id_to_remove - 1]
         values = self.tree.item(item_to_remove)['values']
 
-        self.nutrition_functions.remove_consumed_product(values[1], float(values[2]))
+        # the row leaves the table only after it was deleted from the database
+        def on_removed(deleted_count):
+            if not deleted_count:
+                messagebox.showerror("Error", "The product was not removed, try again!")
+                return
+            if not self.tree.exists(item_to_remove):
+                return
+
+            self.tree.delete(item_to_remove)
 
-        self.tree.delete(item_to_remove)
+            for new_id, item in enumerate(self.tree.get_children(), start = 1):
+                current_values = self.tree.item(item)['values']
+                self.tree.item(item, values = (new_id, *current_values[1:]))
 
-        for new_id, item in enumerate(self.tree.get_children(), start = 1):
-            current_values = self.tree.item(item)['values']
-            self.tree.item(item, values = (new_id, *current_values[1:]))
+        deliver(self, self.nutrition_functions.remove_consumed_product_async(values[1], float(values[2])), on_removed)
 
         self.remove_enter.delete(0, 'end')
 
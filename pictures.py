@@ -0,0 +1,188 @@
+import io
+import os
+import sqlite3
+import struct
+from contextlib import contextmanager
+
+from DB_control import DBControl
+
+# Pictures of PICTURES are read and written by chunks through sqlite blob handles (Connection.blobopen,
+# Python 3.11+), so a picture is not copied into a bytes object before PIL reads it, its size and format
+# are known after reading the header only, and a big picture is stored without having all of it in memory.
+#
+# file-like view of the picture (read, seek, tell), PIL opens it directly, it is valid inside the block
+#       with open_picture("Health_database.db", "Almond") as picture:
+#           if picture is not None:
+#               image = Image.open(picture)
+#               image.load()
+#
+#       read_picture("Health_database.db", "Almond")        # bytes or None
+#       probe_picture("Health_database.db", "Almond")       # {"format": "PNG", "width": 512, "height": 512, "bytes": 5032}
+#
+# store a picture from a file path or a binary file object by chunks (INSERT OR REPLACE)
+#       write_picture("Health_database.db", "Almond", "almond.png")
+#
+# on older Python without blobopen the whole picture is read (and written) as one bytes object
+
+HAS_BLOBOPEN = hasattr(sqlite3.Connection, "blobopen")
+CHUNK_SIZE = 64 * 1024
+# bytes of a JPEG that are searched for the frame header before giving up
+MAX_JPEG_HEADER = 1024 * 1024
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start of frame markers, C4 (Huffman tables), C8 (reserved) and CC (arithmetic coding) are not frames
+_JPEG_FRAMES = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _picture_rowid(db_name, product):
+    rows = DBControl.query_data(db_name, "SELECT rowid FROM PICTURES WHERE PRODUCT = ?;", (product,))
+    return rows[0][0] if rows else None
+
+
+@contextmanager
+def open_picture(db_name, product):
+    # Read-only file-like view of the picture, None if the product has no picture
+    if not HAS_BLOBOPEN:
+        rows = DBControl.query_data(db_name, "SELECT IMAGE FROM PICTURES WHERE PRODUCT = ?;", (product,))
+        yield io.BytesIO(rows[0][0]) if rows else None
+        return
+
+    rowid = _picture_rowid(db_name, product)
+    if rowid is None:
+        yield None
+        return
+
+    try:
+        blob = DBControl.connect(db_name).blobopen("PICTURES", "IMAGE", rowid, readonly=True)
+    except sqlite3.Error as e:
+        print(f"Error in open_picture function: {e}")
+        yield None
+        return
+
+    with blob:
+        yield blob
+
+
+def read_picture(db_name, product):
+    # The whole picture as bytes (one copy from the blob), None if there is no picture
+    with open_picture(db_name, product) as picture:
+        return picture.read() if picture is not None else None
+
+
+def _stream_size(stream):
+    # sqlite3.Blob.seek returns None, so the size is taken by tell()
+    position = stream.tell()
+    stream.seek(0, io.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size - position
+
+
+def probe_header(stream):
+    # (format, width, height) from the header of a PNG, JPEG, GIF, BMP or WEBP picture, None if it is unknown,
+    # only the header is read (for JPEG the segments before the frame are skipped by seek)
+    head = stream.read(30)
+
+    if head.startswith(_PNG_SIGNATURE) and head[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", head[16:24])
+        return "PNG", width, height
+
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        width, height = struct.unpack("<HH", head[6:10])
+        return "GIF", width, height
+
+    if head[:2] == b"BM" and len(head) >= 26:
+        width, height = struct.unpack("<ii", head[18:26])
+        return "BMP", width, abs(height)
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        chunk = head[12:16]
+        if chunk == b"VP8X":
+            width = int.from_bytes(head[24:27], "little") + 1
+            height = int.from_bytes(head[27:30], "little") + 1
+            return "WEBP", width, height
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", head[26:30])
+            return "WEBP", width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(head[21:25], "little")
+            return "WEBP", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        return None
+
+    if head[:2] == b"\xff\xd8":
+        return _probe_jpeg(stream)
+    return None
+
+
+def _probe_jpeg(stream):
+    # Walk the JPEG segments from the start until a frame header that has the size
+    position = 2
+    while position < MAX_JPEG_HEADER:
+        stream.seek(position)
+        marker = stream.read(4)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            return None
+        if marker[1] == 0xFF:
+            # fill byte before a marker
+            position += 1
+            continue
+
+        length = struct.unpack(">H", marker[2:4])[0]
+        if marker[1] in _JPEG_FRAMES:
+            frame = stream.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">HH", frame[1:5])
+            return "JPEG", width, height
+        position += 2 + length
+    return None
+
+
+def probe_picture(db_name, product):
+    # Format, size in pixels and in bytes of the picture from its header, None if there is no picture
+    # (format and size are None if the format is not known)
+    with open_picture(db_name, product) as picture:
+        if picture is None:
+            return None
+        size = _stream_size(picture)
+        header = probe_header(picture) or (None, None, None)
+
+    picture_format, width, height = header
+    return {"format": picture_format, "width": width, "height": height, "bytes": size}
+
+
+def write_picture(db_name, product, source, size=None, chunk_size=CHUNK_SIZE):
+    # Store the picture of the product from a file path or a binary file object (from its current position),
+    # it is copied by chunks into a zeroblob of the size, returns number of written bytes (0 on error)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as file:
+            return write_picture(db_name, product, file, size, chunk_size)
+
+    if size is None:
+        size = _stream_size(source)
+
+    try:
+        if not HAS_BLOBOPEN:
+            data = source.read(size)
+            if len(data) < size:
+                raise ValueError(f"picture of {product} has only {len(data)} of {size} bytes")
+            DBControl.execute_sql(db_name, "INSERT OR REPLACE INTO PICTURES (PRODUCT, IMAGE) VALUES (?, ?);", (product, data))
+            return size
+
+        # the row and its content are one transaction, a half written picture is never visible
+        with DBControl.transaction(db_name) as conn:
+            DBControl.execute_sql(db_name, "INSERT OR REPLACE INTO PICTURES (PRODUCT, IMAGE) VALUES (?, zeroblob(?));",
+                                  (product, size))
+            rowid = _picture_rowid(db_name, product)
+            with conn.blobopen("PICTURES", "IMAGE", rowid, readonly=False) as blob:
+                written = 0
+                while written < size:
+                    chunk = source.read(min(chunk_size, size - written))
+                    if not chunk:
+                        raise ValueError(f"picture of {product} has only {written} of {size} bytes")
+                    blob.write(chunk)
+                    written += len(chunk)
+        return size
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Error in write_picture function: {e}")
+        return 0
@@ -0,0 +1,43 @@
+import os
+
+from DB_control import DBControl
+from generation_cache import GenerationCache
+
+# Per 100 g nutrient records of PRODUCTS (product, proteins, fats, carbs, kcal), cached by (database, product)
+# and shared by Nutrition.check_product and Nutrition.add_consumed_product, so a product that was just checked
+# is added without reading it again. Products of a database are forgotten when PRODUCTS is changed through
+# DBControl, the least recently used ones when there are more than max_size of them.
+#
+#       from product_cache import product_cache
+#       key = product_cache.make_key("Health_database.db", "Quince")
+#       product_cache.get(key)                          # None if the product is not cached
+#       product_cache.clear()                           # after changing PRODUCTS from another process
+#
+#       product_cache.hits, product_cache.misses
+#
+# LRU eviction and the generation counter are in generation_cache.py
+
+
+class ProductCache(GenerationCache):
+    def __init__(self, max_size=1024):
+        super().__init__(max_size)
+
+    @staticmethod
+    def make_key(db_name, product):
+        return os.path.abspath(db_name), product
+
+    def invalidate_database(self, file_name):
+        # Forget the products of the database file
+        key_file = os.path.abspath(file_name)
+        self.invalidate_where(lambda key: key[0] == key_file)
+
+
+product_cache = ProductCache()
+
+
+def _on_table_change(file_name, table_name):
+    if table_name == "PRODUCTS":
+        product_cache.invalidate_database(file_name)
+
+
+DBControl.add_change_listener(_on_table_change)
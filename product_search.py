@@ -0,0 +1,165 @@
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+from DB_control import DBControl
+
+# In-memory type-ahead search over product names, built once from the product list.
+# Results are ranked: names that start with the query, then names with a word that starts with it,
+# then (for 3+ letters) similar names found by shared trigrams, so small typos still match.
+#
+#       index = ProductSearchIndex(nutrition.get_all_products_list())
+#       index.search("chick", limit=20)        # ["Chicken", "Chicken breast", ..., "Boiled chicken", ...]
+#       index.search("chiken")                 # typo, similar names by trigrams
+#
+#       index = get_product_index(db_name, nutrition.get_all_products_list)     # built once per database
+#
+# the index of a database is dropped when PRODUCTS is changed through DBControl and built again on the next
+# search, clear_product_indexes() is needed after changing PRODUCTS from another process
+#
+# all comparisons are case-insensitive
+#
+# Nutrition.search_products uses it only when the database has no full-text index (sqlite without FTS5)
+
+_SPACES = re.compile(r"\s+")
+# a trigram is not used to find similar names if more names than this part of the catalog have it
+COMMON_TRIGRAM_FRACTION = 0.05
+COMMON_TRIGRAM_MIN = 1000
+# names with the most shared trigrams that are scored exactly, per result
+CANDIDATES_PER_RESULT = 4
+# trigrams of the query that are counted, the rarest ones
+MAX_COUNTED_TRIGRAMS = 10
+
+
+def normalize(text):
+    return _SPACES.sub(" ", text.casefold()).strip()
+
+
+def trigrams(text):
+    # Trigrams of the normalized text, padded so that the beginning of the words counts more
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSearchIndex:
+    def __init__(self, names):
+        self.names = sorted(set(names), key=normalize)
+        self.normalized = [normalize(name) for name in self.names]
+
+        # (word, index of the name) sorted by word, for prefix search of every word
+        self.words = sorted(
+            (word, i) for i, name in enumerate(self.normalized) for word in set(name.split(" ")[1:])
+        )
+        self.word_keys = [word for word, _ in self.words]
+
+        # trigram: indexes of the names that have it
+        self.postings = {}
+        self.trigram_counts = []
+        for i, name in enumerate(self.normalized):
+            name_trigrams = trigrams(name)
+            self.trigram_counts.append(len(name_trigrams))
+            for trigram in name_trigrams:
+                self.postings.setdefault(trigram, []).append(i)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _prefix_range(self, keys, prefix):
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + "\U0010ffff", start)
+        return start, end
+
+    def search(self, query, limit=20, min_similarity=0.35):
+        # Names matching the query, at most limit of them, the best ones first
+        query = normalize(query)
+        if not query:
+            return self.names[:limit]
+
+        found = []
+        seen = set()
+
+        def add(index):
+            if index not in seen:
+                seen.add(index)
+                found.append(index)
+
+        start, end = self._prefix_range(self.normalized, query)
+        for i in range(start, min(end, start + limit)):
+            add(i)
+
+        if len(found) < limit:
+            first_word, _, rest = query.partition(" ")
+            if rest:
+                # "chicken bre": names with the word "chicken" that have the whole text from it
+                start, end = bisect_left(self.word_keys, first_word), bisect_right(self.word_keys, first_word)
+            else:
+                start, end = self._prefix_range(self.word_keys, query)
+            for _, i in self.words[start:end]:
+                if not rest or query in self.normalized[i]:
+                    add(i)
+                    if len(found) >= limit:
+                        break
+
+        if len(found) < limit and len(query) >= 3:
+            for i in self._similar(query, limit - len(found), min_similarity, seen):
+                add(i)
+
+        return [self.names[i] for i in found[:limit]]
+
+    def _similar(self, query, limit, min_similarity, exclude):
+        # Indexes of the names with the highest Dice similarity of trigrams
+        query_trigrams = trigrams(query)
+        postings = [self.postings.get(trigram, ()) for trigram in query_trigrams]
+
+        # trigrams that most names have (" g ", "the") only cost time, they are counted as shared by everyone,
+        # and so are the most common ones over MAX_COUNTED_TRIGRAMS of a long query
+        common_size = max(COMMON_TRIGRAM_MIN, int(len(self.names) * COMMON_TRIGRAM_FRACTION))
+        rare = sorted((names for names in postings if len(names) <= common_size), key=len)[:MAX_COUNTED_TRIGRAMS]
+        common = len(postings) - len(rare)
+        if not rare:
+            return []
+
+        counts = Counter()
+        for names in rare:
+            counts.update(names)
+
+        # only the names that share the most trigrams get the exact score, the names with less of them
+        # are worse unless they are much shorter
+        query_count = len(query_trigrams)
+        best = []
+        for i, shared in counts.most_common(limit * CANDIDATES_PER_RESULT + len(exclude)):
+            if i not in exclude:
+                best.append((2 * (shared + common) / (query_count + self.trigram_counts[i]), i))
+        best.sort(reverse=True)
+        return [i for score, i in best[:limit] if score >= min_similarity]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_product_index(db_name, load_names):
+    # Shared index of the database, load_names() is called only when it is built the first time
+    key = os.path.abspath(db_name)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ProductSearchIndex(load_names())
+        return index
+
+
+def clear_product_indexes():
+    # Forget the built indexes, for example after products were imported
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def _on_table_change(file_name, table_name):
+    if table_name == "PRODUCTS":
+        with _indexes_lock:
+            _indexes.pop(os.path.abspath(file_name), None)
+
+
+DBControl.add_change_listener(_on_table_change)
@@ -0,0 +1,175 @@
+import atexit
+import os
+import re
+import sys
+import threading
+from datetime import datetime
+
+# Every statement executed by DBControl is recorded here: wall time, returned (or changed) rows and
+# number of calls, grouped by normalized SQL (literals are replaced with "?"), so
+#       SELECT * FROM PRODUCTS WHERE PRODUCT = 'Carrot'
+#       SELECT * FROM PRODUCTS WHERE PRODUCT = 'Lamb'
+# are counted as one query. Queries slower than slow_threshold_ms can be written to the slow query log
+# together with their EXPLAIN QUERY PLAN, the log is off unless a path is set.
+#
+# print top 10 queries by total time
+#       from query_profiler import profiler
+#       profiler.print_report(10)
+#
+# print the report when the program ends
+#       profiler.report_at_exit(20)
+#
+# the same without changing code, for example for the app:
+#       HEALTH_APP_QUERY_REPORT=20 python main.py
+#
+# write slow queries to the log without changing code
+#       HEALTH_APP_SLOW_QUERY_LOG=slow_queries.log python main.py
+#
+# options
+#       profiler.enabled = False                        # stop recording
+#       profiler.slow_threshold_ms = 50                 # default 100 ms
+#       profiler.slow_log_path = "slow_queries.log"     # default None, the log is off
+#
+# report of a slow query log file
+#       python query_profiler.py slow_queries.log
+
+REPORT_ENV_VARIABLE = "HEALTH_APP_QUERY_REPORT"
+SLOW_LOG_ENV_VARIABLE = "HEALTH_APP_SLOW_QUERY_LOG"
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_VALUES_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+
+def normalize_sql(sql):
+    # Replace literals with "?" and collapse spaces, so queries that differ only by values have one key
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _VALUES_LIST.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip().rstrip(";").strip()
+
+
+class QueryStats:
+    __slots__ = ("calls", "total_time", "max_time", "rows")
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+
+
+class QueryProfiler:
+    def __init__(self):
+        self.enabled = True
+        self.slow_threshold_ms = 100
+        self.slow_log_path = os.environ.get(SLOW_LOG_ENV_VARIABLE) or None
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._report_registered = False
+
+    def record(self, conn, sql, params, elapsed, rows):
+        # Add one executed statement (elapsed in seconds) to the statistics,
+        # params is None for executemany, such a statement is logged without a plan
+        if not self.enabled:
+            return
+
+        key = normalize_sql(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = QueryStats()
+            stats.calls += 1
+            stats.total_time += elapsed
+            stats.rows += rows
+            if elapsed > stats.max_time:
+                stats.max_time = elapsed
+
+        if self.slow_log_path and elapsed * 1000 >= self.slow_threshold_ms:
+            self._log_slow_query(conn, sql, params, key, elapsed, rows)
+
+    def _log_slow_query(self, conn, sql, params, key, elapsed, rows):
+        plan = ""
+        if params is not None and sql.lstrip().upper().startswith(_EXPLAINABLE):
+            try:
+                plan_rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+                plan = "\n".join(f"    {row[-1]}" for row in plan_rows)
+            except Exception as e:
+                plan = f"    (no plan: {e})"
+
+        entry = f"[{datetime.now().isoformat(timespec='seconds')}] {elapsed * 1000:.1f} ms, {rows} rows\n{key}\n"
+        if plan:
+            entry += f"{plan}\n"
+
+        try:
+            with self._lock, open(self.slow_log_path, "a", encoding="utf-8") as file:
+                file.write(entry + "\n")
+        except OSError as e:
+            print(f"[ERROR] Failed to write slow query log: {e}")
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def top(self, top_n=10, sort_by="total_time"):
+        # List of (normalized sql, QueryStats) sorted by total_time, max_time, calls or rows
+        with self._lock:
+            items = list(self._stats.items())
+        items.sort(key=lambda item: getattr(item[1], sort_by), reverse=True)
+        return items[:top_n]
+
+    def report(self, top_n=10, sort_by="total_time"):
+        # Text table of top_n queries
+        lines = [f"{'calls':>8}{'total ms':>12}{'avg ms':>10}{'max ms':>10}{'rows':>10}  query"]
+        for sql, stats in self.top(top_n, sort_by):
+            lines.append(
+                f"{stats.calls:>8}{stats.total_time * 1000:>12.2f}{stats.total_time / stats.calls * 1000:>10.3f}"
+                f"{stats.max_time * 1000:>10.2f}{stats.rows:>10}  {sql}"
+            )
+        return "\n".join(lines)
+
+    def print_report(self, top_n=10, sort_by="total_time"):
+        print(f"\n--- Top {top_n} queries by {sort_by} ---")
+        print(self.report(top_n, sort_by))
+
+    def report_at_exit(self, top_n=10, sort_by="total_time"):
+        if not self._report_registered:
+            self._report_registered = True
+            atexit.register(self.print_report, top_n, sort_by)
+
+
+profiler = QueryProfiler()
+
+if os.environ.get(REPORT_ENV_VARIABLE):
+    profiler.report_at_exit(int(os.environ[REPORT_ENV_VARIABLE]))
+
+
+def summarize_slow_log(path, top_n=10):
+    # Group entries of the slow query log by query, returns list of (query, count, total ms, max ms)
+    groups = {}
+    with open(path, "r", encoding="utf-8") as file:
+        entries = file.read().split("\n\n")
+
+    for entry in entries:
+        lines = entry.strip().splitlines()
+        if len(lines) < 2:
+            continue
+
+        elapsed = float(lines[0].split("] ", 1)[1].split(" ms", 1)[0])
+        count, total, maximum = groups.get(lines[1], (0, 0.0, 0.0))
+        groups[lines[1]] = (count + 1, total + elapsed, max(maximum, elapsed))
+
+    result = [(sql, *values) for sql, values in groups.items()]
+    result.sort(key=lambda item: item[2], reverse=True)
+    return result[:top_n]
+
+
+if __name__ == "__main__":
+    log_path = sys.argv[1] if len(sys.argv) > 1 else "slow_queries.log"
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    print(f"{'count':>8}{'total ms':>12}{'max ms':>10}  query")
+    for sql, count, total, maximum in summarize_slow_log(log_path, limit):
+        print(f"{count:>8}{total:>12.1f}{maximum:>10.1f}  {sql}")
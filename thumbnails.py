@@ -0,0 +1,121 @@
+import argparse
+import io
+import sys
+
+from DB_control import DBControl
+from migrations import apply_migrations
+from pictures import open_picture
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Product pictures resized for the nutrition window are kept in PICTURE_THUMBNAILS, so a selected product
+# is shown without decoding and resizing its full picture. A thumbnail is made on the first request
+# or in bulk for all pictures, triggers on PICTURES delete it when the picture is changed.
+#
+#       thumbnail = get_thumbnail("Health_database.db", "Almond")          # PNG bytes or None
+#       generate_thumbnails("Health_database.db")                          # missing ones, returns their number
+#
+#       python thumbnails.py Health_database.db [--force]
+#
+# Pillow is needed to make thumbnails, without it get_thumbnail returns the full picture
+#       pip install pillow
+
+THUMBNAIL_SIZE = (100, 100)
+THUMBNAIL_FORMAT = "PNG"
+
+
+def _require_pil():
+    if Image is None:
+        raise ImportError("thumbnails need Pillow, install it with: pip install pillow")
+
+
+def make_thumbnail(picture, size=THUMBNAIL_SIZE):
+    # PNG bytes of the picture (bytes or binary file object) resized to size (stretched like the window always showed it)
+    _require_pil()
+    if isinstance(picture, (bytes, bytearray, memoryview)):
+        picture = io.BytesIO(picture)
+    with Image.open(picture) as image:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        thumbnail = image.resize(size)
+
+    output = io.BytesIO()
+    thumbnail.save(output, THUMBNAIL_FORMAT, optimize=True)
+    return output.getvalue()
+
+
+def get_thumbnail(db_name, product, size=THUMBNAIL_SIZE):
+    # Thumbnail of the product picture, it is made and stored on the first request, None if there is no picture
+    rows = DBControl.query_data(db_name, "SELECT IMAGE FROM PICTURE_THUMBNAILS WHERE PRODUCT = ? AND WIDTH = ? AND HEIGHT = ?;",
+                                (product, *size))
+    if rows:
+        return rows[0][0]
+
+    # PIL reads the picture straight from the blob
+    with open_picture(db_name, product) as picture:
+        if picture is None:
+            return None
+        if Image is None:
+            return picture.read()
+
+        try:
+            thumbnail = make_thumbnail(picture, size)
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] Thumbnail of {product} was not made: {e}")
+            picture.seek(0)
+            return picture.read()
+
+    DBControl.execute_sql(db_name, "INSERT OR REPLACE INTO PICTURE_THUMBNAILS (PRODUCT, WIDTH, HEIGHT, IMAGE) VALUES (?, ?, ?, ?);",
+                          (product, *size, thumbnail))
+    return thumbnail
+
+
+def _iter_thumbnails(db_name, products, size):
+    # (product, width, height, thumbnail) of the products, every picture is read from its blob
+    for product in products:
+        with open_picture(db_name, product) as picture:
+            if picture is None:
+                continue
+            try:
+                thumbnail = make_thumbnail(picture, size)
+            except (OSError, ValueError) as e:
+                print(f"[ERROR] Thumbnail of {product} was not made: {e}")
+                continue
+        yield product, *size, thumbnail
+
+
+def generate_thumbnails(db_name, size=THUMBNAIL_SIZE, force=False):
+    # Make thumbnails of all pictures that have none (or one of another size), force=True makes all of them again,
+    # returns number of made thumbnails
+    _require_pil()
+    apply_migrations(db_name)
+
+    if force:
+        DBControl.execute_sql(db_name, "DELETE FROM PICTURE_THUMBNAILS;")
+    else:
+        DBControl.execute_sql(db_name, "DELETE FROM PICTURE_THUMBNAILS WHERE WIDTH <> ? OR HEIGHT <> ?;", size)
+
+    products = [row[0] for row in DBControl.query_data(db_name, """SELECT P.PRODUCT FROM PICTURES P
+                                                                   LEFT JOIN PICTURE_THUMBNAILS T ON T.PRODUCT = P.PRODUCT
+                                                                   WHERE T.PRODUCT IS NULL;""")]
+
+    # pictures are read and resized lazily while the rows are inserted, one commit at the end
+    return DBControl.insert_many(db_name, "PICTURE_THUMBNAILS", ["PRODUCT", "WIDTH", "HEIGHT", "IMAGE"],
+                                 _iter_thumbnails(db_name, products, size))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Make thumbnails of product pictures")
+    parser.add_argument("db_name", nargs="?", default="Health_database.db")
+    parser.add_argument("--force", action="store_true", help="make all thumbnails again")
+    args = parser.parse_args()
+
+    try:
+        count = generate_thumbnails(args.db_name, force=args.force)
+    except ImportError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+    print(f"[INFO] {count} thumbnails made")
@@ -0,0 +1,38 @@
+import os
+
+from generation_cache import GenerationCache
+
+# Daily totals (proteins, fats, carbs, kcal) of CONSUMED, cached by (database, user, date) and shared by
+# CalorieCounting (reads) and Nutrition (writes), so the dashboard is repainted without database reads.
+# Nutrition updates cached days in place after its change is committed, the least recently used days
+# are evicted when there are more than max_size of them.
+#
+#       from totals_cache import totals_cache
+#       key = totals_cache.make_key("Health_database.db", "test@example.com", "2025-06-01")
+#       totals_cache.get(key)                           # None if the day is not cached
+#       totals_cache.add(key, (1.3, 0.1, 6.3, 29))      # consumed product is added to a cached day
+#       totals_cache.clear()                            # after changing CONSUMED outside Nutrition
+#
+#       totals_cache.hits, totals_cache.misses
+#
+# LRU eviction and the generation counter are in generation_cache.py
+
+
+class TotalsCache(GenerationCache):
+    def __init__(self, max_size=256):
+        super().__init__(max_size)
+
+    @staticmethod
+    def make_key(db_name, user_email, day):
+        # days are keyed by the email of the user, as Nutrition and CalorieCounting both read and write them
+        return os.path.abspath(db_name), user_email, str(day)
+
+    def add(self, key, totals, sign=1):
+        # Add committed NUTRITION row values to the cached day, days that are not cached are left to the next read
+        self.update(key, lambda cached: (value + sign * delta for value, delta in zip(cached, totals)))
+
+    def subtract(self, key, totals):
+        self.add(key, totals, sign=-1)
+
+
+totals_cache = TotalsCache()
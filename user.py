@@ -11,9 +11,20 @@ class User:
         self.sex = sex  # 'M' або 'F'
         self.goal = goal  # 'lose', 'gain', 'maintain'
         self.activity_factor = float(activity_factor) # 1.2  1.55  1.9
-    def get_age(self):
-        today = datetime.date.today()
-        birth = datetime.datetime.strptime(self.birth_date, "%Y-%m-%d").date()
+
+    @property
+    def birth_date(self):
+        return self._birth_date
+
+    @birth_date.setter
+    def birth_date(self, value):
+        # the date is parsed once here, not on every get_age() call
+        self._birth_date = value
+        self.birth = datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+    def get_age(self, on_date=None):
+        today = on_date or datetime.date.today()
+        birth = self.birth
         return today.year - birth.year - ((today.month, today.day) < (birth.month, birth.day))
 
     def update_profile(self):
@@ -26,7 +37,7 @@ class User:
         self.height = int(input(f"Height [{self.height} cm]: ") or self.height)
         self.sex = input(f"Sex (M/F) [{self.sex}]: ") or self.sex
         self.goal = input(f"Goal (lose/gain/maintain) [{self.goal}]: ") or self.goal
-        self.activity_factor = input(f"Level of Activity (1.2/1.55/1.9) [{self.activity_factor}]: ") or self.activity_factor
+        self.activity_factor = float(input(f"Level of Activity (1.2/1.55/1.9) [{self.activity_factor}]: ") or self.activity_factor)
         print("Profile updated successfully.\n")
 
     def to_dict(self):